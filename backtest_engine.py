@@ -0,0 +1,257 @@
+"""
+File : backtest_engine.py
+single pass backtest engine for Ath_model.run(rolling=True) , and the process pool of Ath_model.run(workers=n)
+
+cal_data slices every ticker again on every simulated day and recomputes the 252 bar window from scratch.
+here every ticker is walked once per block of days : the trailing windows of all days of the block are
+views of one array, and extremes , moving averages , volatility and season changes are computed for the
+whole block at once. the result is the same history_price_group stream as history_price_filter.
+"""
+
+import os
+import multiprocessing
+from datetime import datetime
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from common_data_type import history_price_group
+from data_analysis import WEEKLY_52_BAR, SEASON_BAR, get_week_start_and_end, last_friday_index, yearly_change, settle_moving_averages
+from benchmark_cache import get_benchmark
+
+BLOCK_DAYS = 63         # simulated days evaluated together, bounds the memory of one block
+SHARDS_PER_WORKER = 4   # smaller shards keep every worker busy until the end
+MOVING_AVG_WEIGHTS = [5, 10, 20, 50, 100, 150, 200]
+VOLUME_AVG_WEIGHTS = [5, 20]
+
+
+def trailing_windows(values: np.ndarray, positions: np.ndarray, width: int, fill: float) -> np.ndarray:
+    """
+    return :
+        one row per position with the width bars ending at that position, bars before the first bar are fill
+    """
+
+    first = int(positions[0]) - width + 1
+    segment = values[max(0, first) : int(positions[-1]) + 1]
+    if first < 0:
+        segment = np.concatenate((np.full(-first, fill), segment))
+
+    return sliding_window_view(segment, width)[positions - positions[0]]
+
+
+def last_moving_averages(values: np.ndarray, positions: np.ndarray, width: int) -> np.ndarray:
+    """
+    last_moving_average of every position , 0 when the window is short or holds a nan
+    """
+
+    # short windows are padded with nan, so they fall to 0 with the nan windows
+    averages = trailing_windows(values, positions, width, np.nan).mean(axis=1)
+    averages[np.isnan(averages)] = 0
+    return averages
+
+
+def rolling_volatility(opens: np.ndarray, closes: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> list:
+    """
+    cal_volatility of the bars starts[i] .. ends[i] , the std of the open to next close changes of every window
+
+    a nan or zero open bar only spoils the windows that hold it, like cal_volatility on the slice
+    """
+
+    width = WEEKLY_52_BAR - 1
+    with np.errstate(invalid="ignore", divide="ignore"):
+        change = (closes[1:] - opens[:-1]) / opens[:-1]
+
+    # change[i] is bar i to bar i + 1 , the window of a row ends with the change into ends[i]
+    last = np.maximum(ends - 1, 0)
+    windows = trailing_windows(change, last, width, np.nan) if len(change) else np.full((len(ends), width), np.nan)
+    first_column = starts - last + width - 1
+    inside = np.arange(width)[None, :] >= first_column[:, None]
+    count = (ends - starts).astype(np.float64)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(inside, windows, 0).sum(axis=1) / count
+        deviation = np.where(inside, windows - mean[:, None], 0)
+        std_dev = np.sqrt((deviation * deviation).sum(axis=1) / count)
+    std_dev[count <= 0] = np.nan
+
+    return ["{:.2f}".format(value * np.sqrt(WEEKLY_52_BAR) * 100) for value in std_dev]
+
+
+def ticker_history(candles: dict, day_timestamps: list, weeks: list) -> dict:
+    """
+    input :
+        1. candles : numpy arrays from to_trading_day_index
+        2. day_timestamps : timestamps of the simulated days
+        3. weeks : (monday, friday) timestamps of every simulated day
+
+    return :
+        {day position : history_price_group} , days without a bar or filtered by history_price_filter are left out
+    """
+
+    timestamps = candles["timestamps"]
+    targets = np.array(day_timestamps)
+    positions = np.searchsorted(timestamps, targets)
+    found = positions < len(timestamps)
+    found[found] = timestamps[positions[found]] == targets[found]
+
+    days = np.flatnonzero(found)
+    if not len(days):
+        return {}
+
+    positions = positions[days]
+    closes = np.asarray(candles["closes"], dtype=np.float64)
+    opens = np.asarray(candles["opens"], dtype=np.float64)
+    volumes = np.asarray(candles["volumes"], dtype=np.float64)
+
+    starts = np.maximum(positions - WEEKLY_52_BAR + 1, 0)
+    lengths = positions - starts + 1
+
+    # first occurrence of the extremes, the padding never wins
+    high_index = positions - WEEKLY_52_BAR + 1 + trailing_windows(closes, positions, WEEKLY_52_BAR, -np.inf).argmax(axis=1)
+    low_index = positions - WEEKLY_52_BAR + 1 + trailing_windows(closes, positions, WEEKLY_52_BAR, np.inf).argmin(axis=1)
+    volatility = rolling_volatility(opens, closes, low_index, positions)
+
+    price_averages = settle_moving_averages(closes[positions], {weight: last_moving_averages(closes, positions, weight) for weight in MOVING_AVG_WEIGHTS},
+                                            lambda row: closes[starts[row] : positions[row] + 1])
+    volume_averages = settle_moving_averages(volumes[positions], {weight: last_moving_averages(volumes, positions, weight) for weight in VOLUME_AVG_WEIGHTS},
+                                             lambda row: volumes[starts[row] : positions[row] + 1])
+    price_averages = {weight: average.tolist() for weight, average in price_averages.items()}
+    volume_averages = {weight: average.tolist() for weight, average in volume_averages.items()}
+
+    season_changes = []
+    for season in range(4, 0, -1):
+        first = np.maximum(positions + 1 - SEASON_BAR * season, 0)
+        last = np.minimum(first + SEASON_BAR - 1, len(closes) - 1)
+        season_changes.append(((lengths >= SEASON_BAR * season).tolist(), closes[first].tolist(), closes[last].tolist()))
+
+    # last friday is before every simulated day, so the full series gives the bar of the slice
+    week_bounds = np.array([weeks[day] for day in days.tolist()])
+    last_fridays = week_bounds[:, 1] - 86400 * 7
+    friday_index = np.searchsorted(timestamps, last_fridays, side="right") - 1
+    direct = (friday_index >= 0) & (timestamps[np.maximum(friday_index, 0)] >= week_bounds[:, 0] - 86400 * 7)
+    direct &= (last_fridays - timestamps[np.maximum(friday_index, 0)]) % 86400 == 0
+    for row in np.flatnonzero(~direct).tolist():
+        friday_index[row] = last_friday_index(timestamps, weeks[days[row]])
+
+    friday_closes = closes[np.maximum(friday_index, 0)].tolist()
+    friday_found = (friday_index >= 0).tolist()
+    high_closes = closes[high_index].tolist()
+    low_closes = closes[low_index].tolist()
+    high_days = timestamps[high_index].tolist()
+    low_days = timestamps[low_index].tolist()
+    last_closes = closes[positions].tolist()
+    last_volumes = volumes[positions].tolist()
+    start_closes = closes[starts].tolist()
+
+    histories = {}
+    for row, day in enumerate(days.tolist()):
+        weekly_52_high = high_closes[row]
+        weekly_52_low = low_closes[row]
+
+        if not weekly_52_high or not weekly_52_low:
+            continue
+
+        monday, friday = weeks[day]
+        high_day = high_days[row]
+        low_day = low_days[row]
+        break_high = monday <= high_day <= friday
+        break_low = monday <= low_day <= friday
+
+        if break_high and break_low:
+            continue
+
+        last_close = last_closes[row]
+        averages = {weight: price_averages[weight][row] for weight in MOVING_AVG_WEIGHTS}
+        above_all = all(last_close >= average for average in averages.values()) and \
+            last_close > averages[20] > averages[50] > averages[200]
+
+        seasons = []
+        for complete, season_first, season_last in season_changes:
+            if not complete[row]:
+                seasons.append(None)
+            else:
+                seasons.append(round(((season_last[row] / season_first[row]) - 1) * 100, 2))
+
+        weekly_change = round(((last_close / friday_closes[row]) - 1) * 100, 2) if friday_found[row] else 0
+
+        histories[day] = history_price_group(
+            weekly_52_high=weekly_52_high,
+            weekly_52_low=weekly_52_low,
+            gap_from_the_last_high=round(((weekly_52_high - last_close) / weekly_52_high) * 100, 2),
+            break_high=break_high,
+            break_low=break_low,
+            break_high_today=high_day == day_timestamps[day],
+            break_low_today=low_day == day_timestamps[day],
+            big_volume=last_volumes[row] > volume_averages[5][row] and last_volumes[row] > volume_averages[20][row],
+            above_all_moving_avg_line=above_all,
+            volatility=volatility[row],
+            weekly_change=weekly_change,
+            yearly_change=yearly_change(bars_cloes_start=start_closes[row], bar_close_end=last_close, weekly_52_low=weekly_52_low),
+            seasons_change=seasons,
+        )
+
+    return histories
+
+
+def rolling_history(tickets_info: dict, all_data: dict, days: list, block_days: int = BLOCK_DAYS):
+    """
+    input :
+        1. tickets_info : tickers to evaluate
+        2. all_data : {ticker : numpy arrays from to_trading_day_index}
+        3. days : simulated days in order
+
+    yield :
+        (day , {ticket_name : history_price_group}) for every day, tickers in tickets_info order
+    """
+
+    for block_start in range(0, len(days), block_days):
+        block = days[block_start : block_start + block_days]
+        day_timestamps = [day.timestamp() for day in block]
+        weeks = [get_week_start_and_end(start_date=day) for day in block]
+
+        daily = [{} for _ in block]
+        for ticket_name in tickets_info:
+            for day, history in ticker_history(all_data[ticket_name], day_timestamps, weeks).items():
+                daily[day][ticket_name] = history
+
+        for day, histories in zip(block, daily):
+            print(f"{datetime.strftime(day, '%Y-%m-%d')} : {len(histories)} stocks")
+            yield day, histories
+
+
+_shard_model = None
+
+def evaluate_shard(shard: tuple) -> list:
+    days, rolling, panel = shard
+    return list(_shard_model.evaluate(days, rolling, panel=panel))
+
+
+def parallel_evaluate(model, days: list, rolling: bool = True, workers: int = os.cpu_count(), panel: bool = False):
+    """
+    Ath_model.evaluate over a process pool , days are split into contiguous shards
+
+    the pool is forked after the model is set, so every worker reads the candle arrays of the parent
+    (copy on write) instead of receiving a copy. workers write their daily report files and return the
+    compact datasheet / classic rows, yielded here in date order.
+    """
+    global _shard_model
+
+    # nothing left to evaluate (a finished resume , start after end) , no benchmark and no pool
+    if not days:
+        return
+
+    # the benchmark is downloaded once here, not once per worker
+    get_benchmark("SPY", reuse_data=model.reuse_data)
+    # the panel too , the workers share it copy on write
+    if panel:
+        model.price_panel()
+
+    shard_count = max(1, min(len(days), workers * SHARDS_PER_WORKER))
+    size = -(-len(days) // shard_count)
+    shards = [(days[start : start + size], rolling, panel) for start in range(0, len(days), size)]
+
+    _shard_model = model
+    try:
+        with multiprocessing.get_context("fork").Pool(processes=workers) as pool:
+            for shard_rows in pool.imap(evaluate_shard, shards):
+                yield from shard_rows
+    finally:
+        _shard_model = None
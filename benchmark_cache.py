@@ -0,0 +1,102 @@
+"""
+File : benchmark_cache.py
+benchmark series (SPY , ^VIX ...) downloaded once per run, kept in memory and under benchmark/
+
+every module reads the series from here :
+    get_benchmark(symbol) : candles.json layout as numpy arrays
+    benchmark_frame(symbol, start, end) : yfinance like frame of the bars in [start, end)
+"""
+
+import os
+import threading
+import numpy as np
+import pandas as pd
+from file_io import ROOT, read_from_json, save_to_json
+from fetch_policy import FetchPolicy
+from get_stock_info import load_prices_from_yahoo
+
+BENCHMARK_DIR = os.path.join(ROOT, "benchmark")
+BENCHMARK_POLICY = FetchPolicy(retries=3, base_delay=2, max_delay=30)
+
+_lock = threading.Lock()
+_series = {}
+
+
+def benchmark_path(symbol: str) -> str:
+    return os.path.join(BENCHMARK_DIR, symbol.replace("^", "_") + ".json")
+
+
+def to_timestamp(date) -> int:
+    """
+    "YYYY-MM-DD" , datetime or pd.Timestamp to the utc midnight timestamp of that day
+    """
+    return int(pd.Timestamp(date).tz_localize(None).normalize().timestamp())
+
+
+def get_benchmark(symbol: str, reuse_data: bool = True, until=None) -> dict:
+    """
+    input :
+        1. symbol : yahoo symbol
+        2. reuse_data : start from the saved series instead of downloading it
+        3. until : the saved series is only reused when it reaches this day
+
+    return :
+        {column : np.ndarray} , the same dict for every call of this run
+    """
+
+    with _lock:
+        if symbol in _series:
+            return _series[symbol]
+
+        path = benchmark_path(symbol)
+        candles = None
+
+        if reuse_data and os.path.exists(path):
+            candles = read_from_json(path)
+            timestamps = candles["timestamps"]
+            if until is not None and (not timestamps or timestamps[-1] < to_timestamp(until)):
+                candles = None
+
+        if candles is None:
+            candles = BENCHMARK_POLICY.call(load_prices_from_yahoo, symbol)._asdict()
+
+            if not os.path.exists(BENCHMARK_DIR):
+                os.makedirs(BENCHMARK_DIR)
+            save_to_json(data=candles, json_file_path=path)
+
+        _series[symbol] = {column : np.asarray(values) for column, values in candles.items()}
+        return _series[symbol]
+
+
+def benchmark_frame(symbol: str, start=None, end=None, reuse_data: bool = True) -> pd.DataFrame:
+    """
+    input :
+        1. symbol : yahoo symbol
+        2. start : first day , None starts at the first bar
+        3. end : day after the last bar (exclusive like yfinance) , None ends at the last bar
+
+    return :
+        frame indexed by Date with Open , High , Low , Close , Volume
+    """
+
+    # the saved series has to reach the last day of the range , a range ending in the future up to today
+    until = start if end is None else min(pd.Timestamp(end) - pd.Timedelta(days=1), pd.Timestamp.today())
+    candles = get_benchmark(symbol, reuse_data=reuse_data, until=until)
+    timestamps = candles["timestamps"]
+
+    first = 0 if start is None else int(np.searchsorted(timestamps, to_timestamp(start)))
+    last = len(timestamps) if end is None else int(np.searchsorted(timestamps, to_timestamp(end)))
+
+    frame = pd.DataFrame(
+        {
+            "Open": candles["opens"][first:last],
+            "High": candles["highs"][first:last],
+            "Low": candles["lows"][first:last],
+            "Close": candles["closes"][first:last],
+            "Volume": candles["volumes"][first:last],
+        },
+        index=pd.to_datetime(timestamps[first:last], unit="s"),
+    )
+    frame.index.name = "Date"
+
+    return frame
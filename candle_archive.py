@@ -0,0 +1,134 @@
+"""
+File : candle_archive.py
+compressed candle archive for long histories
+
+one zlib chunk per ticker :
+    timestamps : first timestamp in the header , int32 deltas in days (seconds when not day aligned)
+    opens , closes , lows , highs : float32
+    volumes : int64 , -1 for a missing volume
+"""
+
+import json
+import struct
+import zlib
+import numpy as np
+
+MAGIC = b"ICZ1"
+DAY = 86400
+COMPRESS_LEVEL = 6
+
+PRICE_COLUMNS = ["opens", "closes", "lows", "highs"]
+
+
+def encode_candles(candles: dict) -> tuple:
+    """
+    return :
+        (chunk bytes , header entry [bars, first_timestamp, timestamp_unit])
+    """
+
+    timestamps = np.asarray(candles["timestamps"], dtype=np.int64)
+    bars = len(timestamps)
+    first_timestamp = int(timestamps[0]) if bars else 0
+
+    unit = DAY if bars and not (timestamps % DAY).any() else 1
+    deltas = (np.diff(timestamps) // unit).astype(np.int32)
+
+    volumes = np.asarray(candles["volumes"], dtype=np.float64)
+    volumes = np.where(np.isfinite(volumes), volumes, -1).astype(np.int64)
+
+    raw = deltas.tobytes()
+    for column in PRICE_COLUMNS:
+        raw += np.asarray(candles[column], dtype=np.float32).tobytes()
+    raw += volumes.tobytes()
+
+    return zlib.compress(raw, COMPRESS_LEVEL), [bars, first_timestamp, unit]
+
+
+def decode_candles(chunk: bytes, bars: int, first_timestamp: int, unit: int) -> dict:
+    raw = zlib.decompress(chunk)
+    offset = 0
+
+    def take(dtype, count):
+        nonlocal offset
+        array = np.frombuffer(raw, dtype=dtype, count=count, offset=offset)
+        offset += array.nbytes
+        return array
+
+    deltas = take(np.int32, max(0, bars - 1))
+    timestamps = np.empty(bars, dtype=np.int64)
+    if bars:
+        timestamps[0] = first_timestamp
+        timestamps[1:] = first_timestamp + np.cumsum(deltas, dtype=np.int64) * unit
+
+    candles = {column: take(np.float32, bars).astype(np.float64) for column in PRICE_COLUMNS}
+
+    volumes = take(np.int64, bars).astype(np.float64)
+    volumes[volumes < 0] = np.nan
+    candles["volumes"] = volumes
+    candles["timestamps"] = timestamps
+
+    return candles
+
+
+def save_candle_archive(all_candles: dict, archive_path: str) -> None:
+    """
+    input :
+        1. all_candles : {ticker : {column : list}} (candles.json layout)
+        2. archive_path : archive file, replaced as a whole
+    """
+
+    tickers = {}
+    chunks = []
+    offset = 0
+    for name, candles in all_candles.items():
+        chunk, entry = encode_candles(candles)
+        tickers[name] = [offset, len(chunk)] + entry
+        chunks.append(chunk)
+        offset += len(chunk)
+
+    header = json.dumps({"tickers": tickers}).encode()
+
+    with open(file=archive_path, mode="wb") as file:
+        file.write(MAGIC)
+        file.write(struct.pack("<I", len(header)))
+        file.write(header)
+        for chunk in chunks:
+            file.write(chunk)
+
+
+def read_candle_archive(archive_path: str, tickers=None) -> dict:
+    """
+    input :
+        1. archive_path : archive file
+        2. tickers : tickers to decode, None decodes every ticker
+
+    return :
+        {ticker : {column : np.ndarray}}, tickers missing in the archive are left out
+    """
+
+    with open(file=archive_path, mode="rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{archive_path} is not a candle archive")
+
+        (header_size,) = struct.unpack("<I", file.read(4))
+        index = json.loads(file.read(header_size))["tickers"]
+        data_start = file.tell()
+
+        if tickers is None:
+            # a cold load decodes everything , one read of the whole payload
+            payload = memoryview(file.read())
+            return {
+                name: decode_candles(payload[offset : offset + size], bars, first_timestamp, unit)
+                for name, (offset, size, bars, first_timestamp, unit) in index.items()
+            }
+
+        wanted = set(tickers)
+        all_candles = {}
+        for name, (offset, size, bars, first_timestamp, unit) in index.items():
+            if name not in wanted:
+                continue
+
+            file.seek(data_start + offset)
+            all_candles[name] = decode_candles(file.read(size), bars, first_timestamp, unit)
+
+    return all_candles
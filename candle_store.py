@@ -0,0 +1,135 @@
+"""
+File : candle_store.py
+columnar candle store, one .npy per column behind a ticker offset index
+"""
+
+import os
+import json
+import shutil
+import numpy as np
+
+INDEX_FILE = "index.json"
+
+COLUMN_TYPES = {
+    "opens": np.float64,
+    "closes": np.float64,
+    "lows": np.float64,
+    "highs": np.float64,
+    "volumes": np.float64,
+    "timestamps": np.int64,
+}
+
+
+def save_candle_store(all_candles: dict, store_path: str) -> None:
+    """
+    input :
+        1. all_candles : {ticker : {column : list}} (candles.json layout)
+        2. store_path : store folder, replaced as a whole
+    """
+
+    tickers = {}
+    offset = 0
+    for name, candles in all_candles.items():
+        length = len(candles["timestamps"])
+        tickers[name] = [offset, length]
+        offset += length
+
+    tmp_path = store_path + ".tmp"
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    for column, dtype in COLUMN_TYPES.items():
+        data = np.empty(offset, dtype=dtype)
+        for name, candles in all_candles.items():
+            start, length = tickers[name]
+            data[start : start + length] = np.asarray(candles[column], dtype=dtype)
+        np.save(os.path.join(tmp_path, column + ".npy"), data)
+
+    with open(file=os.path.join(tmp_path, INDEX_FILE), mode="w") as file:
+        json.dump({"tickers": tickers, "total": offset}, file)
+
+    # the old store is moved aside first , a crash at any point leaves a whole store (recover_candle_store).
+    # opened stores keep their mmap of the old files
+    old_path = store_path + ".old"
+    if os.path.exists(old_path):
+        shutil.rmtree(old_path)
+    if os.path.exists(store_path):
+        os.rename(store_path, old_path)
+    os.rename(tmp_path, store_path)
+    if os.path.exists(old_path):
+        shutil.rmtree(old_path)
+
+
+def recover_candle_store(store_path: str) -> None:
+    """
+    put the old store back when save_candle_store stopped between its two renames
+    """
+    old_path = store_path + ".old"
+    if not os.path.exists(store_path) and os.path.exists(old_path):
+        os.rename(old_path, store_path)
+
+
+class CandleStore:
+    """
+    read only candle store, every column is memory mapped
+    store[ticker] returns {column : array view} like candles.json
+    """
+
+    def __init__(self, store_path: str) -> None:
+        with open(file=os.path.join(store_path, INDEX_FILE), mode="r") as file:
+            self.index : dict = json.load(file)["tickers"]
+
+        self.data = {
+            column: np.load(os.path.join(store_path, column + ".npy"), mmap_mode="r")
+            for column in COLUMN_TYPES
+        }
+
+    def __contains__(self, ticker) -> bool:
+        return ticker in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __getitem__(self, ticker) -> dict:
+        start, length = self.index[ticker]
+        return {column: data[start : start + length] for column, data in self.data.items()}
+
+    def keys(self):
+        return self.index.keys()
+
+    def get(self, ticker, default=None):
+        return self[ticker] if ticker in self.index else default
+
+    def column(self, ticker, column) -> np.ndarray:
+        start, length = self.index[ticker]
+        return self.data[column][start : start + length]
+
+    def select(self, tickers=None, columns=None, window: int = None) -> dict:
+        """
+        input :
+            1. tickers : tickers to load, None loads every ticker
+            2. columns : columns to load, None loads every column
+            3. window : only keep the last window bars
+
+        return :
+            {ticker : {column : array}}, arrays are copies so only the touched pages are read
+        """
+
+        wanted = None if tickers is None else set(tickers)
+        # keep the store order, whatever container tickers is
+        tickers = [ticker for ticker in self.index if wanted is None or ticker in wanted]
+        columns = list(COLUMN_TYPES) if columns is None else columns
+
+        selected = {}
+        for ticker in tickers:
+            start, length = self.index[ticker]
+            if window is not None:
+                start, length = start + max(0, length - window), min(length, window)
+
+            selected[ticker] = {column: np.array(self.data[column][start : start + length]) for column in columns}
+
+        return selected
@@ -0,0 +1,173 @@
+"""
+File : candle_validation.py
+check every ticker's candles at once, bad series are quarantined before analysis
+"""
+
+import numpy as np
+import pandas as pd
+from candle_store import CandleStore, COLUMN_TYPES
+from file_io import save_to_json
+
+QUARANTINE_JSON = "quarantine.json"
+VALIDATION_REPORT = "validation_report.csv"
+
+RECENT_BARS = 252       # without a window , only the last year of bars is checked
+MAX_GAP_DAYS = 10       # calendar days allowed between two bars
+STALE_DAYS = 10         # days the last bar may lag behind the newest bar of the universe
+
+PRICE_COLUMNS = ["opens", "closes", "lows", "highs"]
+
+
+def flatten_candles(all_candles) -> tuple:
+    """
+    return :
+        (names, starts, lengths, {column : flat array}) , every ticker's bars back to back
+    """
+
+    names = list(all_candles.keys())
+
+    if isinstance(all_candles, CandleStore):
+        starts = np.array([all_candles.index[name][0] for name in names], dtype=np.int64)
+        lengths = np.array([all_candles.index[name][1] for name in names], dtype=np.int64)
+        return names, starts, lengths, all_candles.data
+
+    lengths = np.array([len(all_candles[name]["timestamps"]) for name in names], dtype=np.int64)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.int64)
+    data = {
+        column: np.concatenate([np.asarray(all_candles[name][column], dtype=dtype) for name in names] or [np.empty(0, dtype=dtype)])
+        for column, dtype in COLUMN_TYPES.items()
+    }
+    return names, starts, lengths, data
+
+
+def window_bars(timestamps: np.ndarray, starts: np.ndarray, lengths: np.ndarray, since, until, lookback_bars: int) -> np.ndarray:
+    """
+    return :
+        flag of every flat bar , True for the bars the analysis of the days since .. until reads
+        (lookback_bars bars before the first day , every bar up to until)
+    """
+
+    window = np.zeros(len(timestamps), dtype=bool)
+    for start, length in zip(starts.tolist(), lengths.tolist()):
+        bars = timestamps[start : start + length]
+        first = 0 if since is None else max(0, int(np.searchsorted(bars, since)) - lookback_bars)
+        last = length if until is None else int(np.searchsorted(bars, until, side="right"))
+        window[start + first : start + last] = True
+
+    return window
+
+
+def validate_candles(all_candles, since=None, until=None, lookback_bars: int = RECENT_BARS - 1) -> pd.DataFrame:
+    """
+    input :
+        1. all_candles : candles.json dict or CandleStore
+        2. since : timestamp of the first analysed day , None checks the last RECENT_BARS bars
+        3. until : timestamp of the last analysed day , None checks up to the last bar
+        4. lookback_bars : bars before since that the analysis of the first day reads
+
+    only the bars the analysis reads are checked , a bad bar years before the backtest or after it
+    does not quarantine the ticker. stale is only checked when the window reaches the newest bar.
+
+    return :
+        one row per ticker with the count of every problem and the quarantine decision
+    """
+
+    names, starts, lengths, data = flatten_candles(all_candles)
+    total = int(lengths.sum())
+
+    prices = np.stack([np.asarray(data[column][:total], dtype=np.float64) for column in PRICE_COLUMNS])
+    volumes = np.asarray(data["volumes"][:total], dtype=np.float64)
+    timestamps = np.asarray(data["timestamps"][:total], dtype=np.int64)
+
+    if since is None and until is None:
+        position = np.arange(total) - np.repeat(starts, lengths)
+        window = position >= np.repeat(lengths - RECENT_BARS, lengths)
+    else:
+        window = window_bars(timestamps, starts, lengths, since, until, lookback_bars)
+
+    non_finite = window & (~np.isfinite(prices).all(axis=0) | ~np.isfinite(volumes))
+    with np.errstate(invalid="ignore"):
+        non_positive = window & (prices <= 0).any(axis=0)
+    zero_volume = window & (volumes == 0)
+
+    # first bar of every ticker has no previous bar
+    first_bar = np.zeros(total, dtype=bool)
+    first_bar[starts[lengths > 0]] = True
+
+    step = np.zeros(total, dtype=np.int64)
+    step[1:] = np.diff(timestamps)
+    step[first_bar] = 1
+
+    # the step into the first bar of the window comes from outside of it
+    first_in_window = window.copy()
+    first_in_window[1:] &= ~window[:-1]
+    first_in_window |= first_bar
+
+    # searchsorted of slice_data runs on the whole series , so order is checked everywhere
+    non_monotonic = step <= 0
+    gap_days = np.where(first_in_window | ~window, 0, step // 86400)
+    window_gap = gap_days > MAX_GAP_DAYS
+
+    # per ticker sums, reduceat is only defined for non empty segments
+    filled = lengths > 0
+    def per_ticker(flags, reduce=np.add):
+        result = np.zeros(len(names), dtype=np.int64)
+        if total:
+            result[filled] = reduce.reduceat(flags.astype(np.int64), starts[filled])
+        return result
+
+    last_timestamp = np.zeros(len(names), dtype=np.int64)
+    last_timestamp[filled] = timestamps[np.cumsum(lengths)[filled] - 1]
+    newest = last_timestamp.max() if total else 0
+    # a ticker that stopped trading before a historical window ends has no bar on those days , not stale data
+    if until is None or until >= newest:
+        stale = filled & (newest - last_timestamp > STALE_DAYS * 86400)
+    else:
+        stale = np.zeros(len(names), dtype=bool)
+
+    checked = per_ticker(window)
+
+    report = pd.DataFrame({
+        "ticker": names,
+        "bars": lengths,
+        "checked_bars": checked,
+        "non_finite": per_ticker(non_finite),
+        "non_positive": per_ticker(non_positive),
+        "non_monotonic": per_ticker(non_monotonic),
+        "zero_volume": per_ticker(zero_volume),
+        "max_gap_days": per_ticker(gap_days, reduce=np.maximum),
+        "window_gaps": per_ticker(window_gap),
+        "stale": stale,
+    })
+
+    reasons = {
+        "empty": checked == 0,
+        "non_finite": report["non_finite"].to_numpy() > 0,
+        "non_positive": report["non_positive"].to_numpy() > 0,
+        "non_monotonic": report["non_monotonic"].to_numpy() > 0,
+        "gap": report["window_gaps"].to_numpy() > 0,
+        "stale": stale,
+    }
+
+    report["reason"] = [
+        " ,".join(reason for reason, flags in reasons.items() if flags[idx])
+        for idx in range(len(names))
+    ]
+    report["quarantined"] = report["reason"] != ""
+
+    return report
+
+
+def save_quarantine(report: pd.DataFrame) -> set:
+    """
+    write validation_report.csv and quarantine.json, return the quarantined tickers
+    """
+
+    report.to_csv(VALIDATION_REPORT, index=False)
+
+    quarantine = report.loc[report["quarantined"], "ticker"].to_list()
+    save_to_json(data=quarantine, json_file_path=QUARANTINE_JSON)
+
+    print(f"quarantine {len(quarantine)} / {len(report)} tickers")
+
+    return set(quarantine)
@@ -58,6 +58,8 @@ candles_info = namedtuple(
 )
 
 class market_group:
+    __slots__ = ("industry", "max_ath", "max_atl", "ath_count", "atl_count")
+
     def __init__(self) -> None:
         self.industry = {}
         self.max_ath = "n/a"
@@ -65,13 +67,24 @@ class market_group:
         self.ath_count = 0
         self.atl_count = 0
 
+    def compact(self) -> None:
+        """
+        drop the history_price_group of every stock once the reports of the day are written,
+        the counts and the ticker groups stay
+        """
+        for industry_data in self.industry.values():
+            industry_data.stock = {}
+
     def __repr__(self) -> str:
         return f"max_ath : {self.max_ath} , max_atl : {self.max_atl} , ath_count : {self.ath_count} , atl_count : {self.atl_count}"
 
 
 class industry_group:
+    __slots__ = ("stock", "total_stocks", "ath_count", "atl_count", "week_change_avg", "break_high_group", "break_low_group", "approach_high")
+
     def __init__(self) -> None:
         self.stock = {}
+        self.total_stocks = 0
         self.ath_count = 0
         self.atl_count = 0
         self.week_change_avg = 0
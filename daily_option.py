@@ -6,14 +6,18 @@ from pathlib import Path
 import sys
 import json
 import traceback
-import time
-import yfinance as yf
+from benchmark_cache import benchmark_frame
+from fetch_policy import FetchPolicy
 from update_news import chat
 from option_skew_plot import run_skew_plot
 
 CACHE_FILE = Path("option_task_cache.json")
-MAX_RETRIES = 12 
-RETRY_INTERVAL = 300 #seconds
+MAX_RETRIES = 15 
+RETRY_INTERVAL = 300 #seconds, longest wait between two attempts
+
+# waits for the provider to publish today's open interest, 30s 60s 120s 240s then RETRY_INTERVAL ,
+# 3450s in total , no less than the 11 x 300s the fixed interval waited
+SNAPSHOT_POLICY = FetchPolicy(retries=MAX_RETRIES, base_delay=30, max_delay=RETRY_INTERVAL, retry_on=(DataNotUpdatedError,), host=None, jitter=False)
 
 
 def is_holiday(date: datetime) -> bool:
@@ -57,8 +61,7 @@ def get_spy_price_at(date_str: str) -> float:
     date = datetime.strptime(date_str, "%Y-%m-%d")
     next_day = date + timedelta(days=1)
 
-    ticker = yf.Ticker("SPY")
-    df = ticker.history(start=date_str, end=next_day.strftime("%Y-%m-%d"))
+    df = benchmark_frame("SPY", start=date_str, end=next_day.strftime("%Y-%m-%d"))
     
     if df.empty:
         raise ValueError(f"No data found for {date_str}")
@@ -88,24 +91,18 @@ if __name__ == "__main__":
         sys.exit(1)
 
     # Run the task
-    for attempt in range(1, MAX_RETRIES + 1):
-        try:
-            print(f"[Attempt {attempt}] Executing snapshot task...")
-            save_option_snap(today=process_day)
-            delete_cache()
-            break
-        except DataNotUpdatedError as e:
-            print(f"Data not ready: {e}")
-            if attempt < MAX_RETRIES:
-                print(f"Will retry in {RETRY_INTERVAL} seconds...\n")
-                time.sleep(RETRY_INTERVAL)
-            else:
-                print("Max retries reached. Giving up.")
-                sys.exit(2)
-        except Exception:
-            print("Save Snapshot Task execution failed with unexpected error:")
-            traceback.print_exc()
-            sys.exit(1)
+    try:
+        print("Executing snapshot task...")
+        SNAPSHOT_POLICY.call(save_option_snap, today=process_day)
+        delete_cache()
+    except DataNotUpdatedError as e:
+        print(f"Data not ready: {e}")
+        print("Max retries reached. Giving up.")
+        sys.exit(2)
+    except Exception:
+        print("Save Snapshot Task execution failed with unexpected error:")
+        traceback.print_exc()
+        sys.exit(1)
 
     try:
         process_snapshot_analysis(today=process_day,
@@ -3,8 +3,10 @@ from datetime import datetime , timedelta
 from pandas_market_calendars import get_calendar
 import sys
 from get_stock_info import MARKET_CAP_10E
+from feature_store import update_feature_store
 
 from pathlib import Path
+import os
 import shutil
 
 def restore():
@@ -44,5 +46,8 @@ if __name__ == "__main__":
 
     restore()
 
-    ath_model = Ath_model(start_date=START,end_date=END,gap_to_high_range=RANGE,marketCap=MARKET_CAP_10E,reuse_data=False)
-    ath_model.run()
+    ath_model = Ath_model(start_date=START,end_date=END,gap_to_high_range=RANGE,marketCap=MARKET_CAP_10E,reuse_data=False,incremental=True)
+    ath_model.run(ticker_workers=os.cpu_count())
+
+    # tradingview_list and efficient_stock read the indicators of tonight from here
+    update_feature_store(all_candles=ath_model.stocks_price_data)
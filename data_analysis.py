@@ -5,11 +5,15 @@ process data
 
 from common_data_type import industry_group,market_group,sliced_candle_info,history_price_group
 from datetime import datetime , timedelta
-from get_stock_info import load_prices_from_yahoo , get_stock_history_price_data , get_total_stocks_basic_info , MARKET_CAP_100E
+from get_stock_info import get_stock_history_price_data , get_total_stocks_basic_info , MARKET_CAP_100E
+from benchmark_cache import get_benchmark
+from candle_validation import validate_candles , save_quarantine
+from report_builder import ReportBuilder , CsvAppender
 from file_io import read_from_json , save_to_json
 import pandas as pd
 import numpy as np
 import os
+import multiprocessing
 
 
 PERIOD = 1 * 365 + 183
@@ -17,40 +21,94 @@ WEEKLY_52_BAR = 252
 SEASON_BAR = 63
 LIMIT = datetime(year=2019,month=12,day=27,hour=8)
 RANGE = 10
+# relative gap under which np.mean and the pandas rolling mean may order two moving averages differently
+MA_TIE_TOLERANCE = 1e-8
+DATASHEET_CSV = "datasheet.csv"
+CHECKPOINT_JSON = "backtest_checkpoint.json"
+CHECKPOINT_DAYS = 20    # finished days between two checkpoints
+# industry keywords save_rs_report leaves out of the rs report
+EXCLUDE_INDUSTRIES = 'Bio|Medical|Drug|Health|Diagnostics|Banks|REIT|Utilities|Gold|Silver|Precious|Asset Management'
+
+def last_friday_index(timestamps: np.ndarray, this_week: tuple) -> int:
+    """
+    bar of last friday, or of the last day of last week with a bar , -1 when last week has no bar
+    """
+    firday_last_week_timestamp = this_week[1] - (86400 * 7)
+    limit = this_week[0] - (86400 * 7)
+
+    # walk back from last friday to last monday over the bars only, days without a bar are skipped
+    index = int(np.searchsorted(timestamps, firday_last_week_timestamp, side="right")) - 1
+
+    while index >= 0 and timestamps[index] >= limit:
+        if (firday_last_week_timestamp - timestamps[index]) % 86400 == 0:
+            return index
+        index -= 1
+
+    return -1
 
 @staticmethod
 def week_change(candles:sliced_candle_info) -> float:
-    index = 0
-    firday_last_week_timestamp = candles.this_week[1] - (86400 * 7)
-    limit = datetime.fromtimestamp(candles.this_week[0] - (86400 * 7))
-
-    while True:
-        now_date = datetime.fromtimestamp(firday_last_week_timestamp)
-        print(f"firday_last_week_timestamp = {firday_last_week_timestamp}")
-        print(f"week change now date = {now_date} / limit = {limit}")
-
-        if now_date < limit:
-            print("Noooooo Find")
-            return 0
-
-        if firday_last_week_timestamp in candles.timestamps:
-            index = candles.timestamps.index(firday_last_week_timestamp)
-            print(f"index = {index} , datetime = {datetime.fromtimestamp(firday_last_week_timestamp)}")
-            break
-        else:
-            firday_last_week_timestamp -= 86400
+    index = last_friday_index(candles.timestamps, candles.this_week)
+
+    if index < 0:
+        print("Noooooo Find")
+        return 0
 
-    return round(( (candles.closes[-1] /candles.closes[index]) -1 ) * 100 ,2)
+    return round(( (float(candles.closes[-1]) / float(candles.closes[index])) -1 ) * 100 ,2)
 
 def calculate_moving_average(data:list,moving_weight : int = 5) -> list:
     df = pd.DataFrame(data,columns=['Price'])
     df[f'MA{moving_weight}'] = df['Price'].rolling(window=moving_weight).mean().fillna(0)
     return df[f'MA{moving_weight}'].tolist()
 
+def last_moving_average(data:np.ndarray,moving_weight : int = 5) -> float:
+    """
+    calculate_moving_average(data, moving_weight)[-1] without building the whole series ,
+    it can be an ulp off the pandas rolling sum (settle_moving_averages)
+    """
+    if len(data) < moving_weight:
+        return 0
+
+    average = float(np.mean(data[-moving_weight:]))
+    return 0 if np.isnan(average) else average
+
+def settle_moving_averages(last: np.ndarray, averages: dict, bars) -> dict:
+    """
+    np.mean and the rolling sum of calculate_moving_average can round one average an ulp apart , which flips
+    a comparison of two values that are equal on paper (ma20 == ma50 , close == ma5). rows where last and
+    the averages come closer than MA_TIE_TOLERANCE take calculate_moving_average of their bars for those averages
+
+    input :
+        1. last : last value of every row
+        2. averages : {weight : moving average of every row} , settled in place
+        3. bars : row -> the bars history_price_filter averages for the row (its last WEEKLY_52_BAR bars)
+
+    return :
+        averages
+    """
+
+    # close values are neighbours once sorted, nan never counts as close , column 0 is last
+    weights = [None] + list(averages)
+    values = np.column_stack([last] + list(averages.values()))
+    order = np.argsort(values, axis=1)
+    values = np.take_along_axis(values, order, axis=1)
+    with np.errstate(invalid="ignore"):
+        close = np.abs(np.diff(values, axis=1)) < MA_TIE_TOLERANCE * np.abs(values[:, 1:])
+
+    for row in np.flatnonzero(close.any(axis=1)).tolist():
+        data = bars(row)
+        columns = set(order[row, :-1][close[row]].tolist()) | set(order[row, 1:][close[row]].tolist())
+        for weight in (weights[column] for column in columns if column):
+            averages[weight][row] = calculate_moving_average(data, weight)[-1]
+
+    return averages
+
 def above_all_moving_avg_line(data):
     weights = [5, 10, 20, 50, 100, 150, 200]
-    moving_averages = {weight: calculate_moving_average(data, weight)[-1] for weight in weights}
-    last_price = data[-1]
+    last_price = float(data[-1])
+    moving_averages = settle_moving_averages(
+        np.array([last_price]), {weight: np.array([last_moving_average(data, weight)]) for weight in weights}, lambda row: data)
+    moving_averages = {weight: float(average[0]) for weight, average in moving_averages.items()}
 
     above_all = all(last_price >= moving_averages[weight] for weight in weights)
     
@@ -60,15 +118,9 @@ def above_all_moving_avg_line(data):
 
     return above_all and specific_condition
 
-def cal_volatility(open_bars : list,close_bars : list):
-    change = []
-
-    days = len(open_bars)
-
-    for idx in range(days-1):
-        open_price = open_bars[idx]
-        close_price = close_bars[idx+1]
-        change.append((close_price-open_price)/open_price)
+def cal_volatility(open_bars : np.ndarray,close_bars : np.ndarray):
+    # open of one bar to the close of the next bar
+    change = (close_bars[1:] - open_bars[:-1]) / open_bars[:-1]
 
     std_dev = np.std(change)
 
@@ -77,7 +129,7 @@ def cal_volatility(open_bars : list,close_bars : list):
 def yearly_change(bars_cloes_start : int , weekly_52_low : int , bar_close_end : int):
     return round(((bar_close_end / bars_cloes_start) -1 ) * 100 ,2) if bars_cloes_start < weekly_52_low else round(((bar_close_end / weekly_52_low) -1 ) * 100 ,2) 
 
-def seanson_change(bar_close : list) -> list:
+def seanson_change(bar_close : np.ndarray) -> list:
     changes = []
     for i in range(4,0,-1):
         tmp = bar_close[-1 * SEASON_BAR * i :]
@@ -85,40 +137,47 @@ def seanson_change(bar_close : list) -> list:
             changes.append(None)
         else:
             tmp = tmp[:SEASON_BAR]
-            changes.append(round(((tmp[-1] / tmp[0]) - 1)* 100,2))
+            changes.append(round(((float(tmp[-1]) / float(tmp[0])) - 1)* 100,2))
     return changes
 
 @staticmethod
 def history_price_filter(candles: sliced_candle_info) -> history_price_group:
     """
     cal 52 weekly day high and low (210 kbars)
+    candles : numpy arrays, every value works on views of the last WEEKLY_52_BAR bars
     """
 
     def is_high_low_between_this_week(day,start,end):
             return True if start <= day <= end else False
 
-    bars_high : list  = candles.highs[-WEEKLY_52_BAR:]
-    bars_low : list = candles.lows[-WEEKLY_52_BAR:]
-    bars_close : list = candles.closes[-WEEKLY_52_BAR:]
-    bars_open : list = candles.opens[-WEEKLY_52_BAR:]
-    volume : list = candles.volumes[-WEEKLY_52_BAR:]
-    timestamp : list = candles.timestamps[-WEEKLY_52_BAR:]
+    bars_close : np.ndarray = candles.closes[-WEEKLY_52_BAR:]
+    bars_open : np.ndarray = candles.opens[-WEEKLY_52_BAR:]
+    volume : np.ndarray = candles.volumes[-WEEKLY_52_BAR:]
+    timestamp : np.ndarray = candles.timestamps[-WEEKLY_52_BAR:]
 
-    weekly_52_high = max(bars_close)
-    weekly_52_low = min(bars_close)
+    # argmax / argmin return the first bar of the extreme like list.index
+    high_index = int(np.argmax(bars_close))
+    low_index = int(np.argmin(bars_close))
+    weekly_52_high = float(bars_close[high_index])
+    weekly_52_low = float(bars_close[low_index])
 
     if not weekly_52_high or not weekly_52_low:
         return None
 
-    gap = round(((weekly_52_high - bars_close[-1]) / weekly_52_high) * 100, 2)
-    ma5 = calculate_moving_average(volume)
-    ma20 = calculate_moving_average(volume,20)
-
-    break_high = is_high_low_between_this_week(timestamp[bars_close.index(weekly_52_high)], candles.this_week[0],candles.this_week[1])
-    break_low =  is_high_low_between_this_week(timestamp[bars_close.index(weekly_52_low)], candles.this_week[0],candles.this_week[1])
-    break_high_today = timestamp[bars_close.index(weekly_52_high)] == candles.today
-    break_low_today = timestamp[bars_close.index(weekly_52_low)] == candles.today
-    big_volume = volume[-1] > ma5[-1] and volume[-1] > ma20[-1]
+    last_close = float(bars_close[-1])
+    gap = round(((weekly_52_high - last_close) / weekly_52_high) * 100, 2)
+    volume_averages = settle_moving_averages(
+        volume[-1:], {5: np.array([last_moving_average(volume)]), 20: np.array([last_moving_average(volume,20)])}, lambda row: volume)
+    ma5 = float(volume_averages[5][0])
+    ma20 = float(volume_averages[20][0])
+
+    high_day = int(timestamp[high_index])
+    low_day = int(timestamp[low_index])
+    break_high = is_high_low_between_this_week(high_day, candles.this_week[0],candles.this_week[1])
+    break_low =  is_high_low_between_this_week(low_day, candles.this_week[0],candles.this_week[1])
+    break_high_today = high_day == candles.today
+    break_low_today = low_day == candles.today
+    big_volume = float(volume[-1]) > ma5 and float(volume[-1]) > ma20
 
     history = history_price_group(
         weekly_52_high=weekly_52_high,
@@ -130,9 +189,9 @@ def history_price_filter(candles: sliced_candle_info) -> history_price_group:
         break_low_today=break_low_today,
         big_volume = big_volume,
         above_all_moving_avg_line=above_all_moving_avg_line(bars_close),
-        volatility = cal_volatility(bars_open[bars_close.index(weekly_52_low):],bars_close[bars_close.index(weekly_52_low):]),
+        volatility = cal_volatility(bars_open[low_index:],bars_close[low_index:]),
         weekly_change=week_change(candles=candles),
-        yearly_change=yearly_change(bars_cloes_start=bars_close[0],bar_close_end=bars_close[-1],weekly_52_low=weekly_52_low),
+        yearly_change=yearly_change(bars_cloes_start=float(bars_close[0]),bar_close_end=last_close,weekly_52_low=weekly_52_low),
         seasons_change=seanson_change(bar_close=bars_close),
     )
 
@@ -141,12 +200,68 @@ def history_price_filter(candles: sliced_candle_info) -> history_price_group:
 
     return history
 
+TICKER_CHUNK = 256     # tickers per task of the cal_data pool
+
+_chunk_data = None
+
+def evaluate_chunk(chunk: tuple) -> list:
+    """
+    slice_data + history_price_filter of a chunk of tickers in a cal_data worker
+
+    return :
+        [(ticket_name , history_price_group)] of the tickers that pass
+    """
+    start_date, ticket_names = chunk
+
+    histories = []
+    for ticket_name in ticket_names:
+        candles = slice_data(start_date=start_date, ticket_candles=_chunk_data[ticket_name])
+        if candles is None:
+            continue
+
+        his_data = history_price_filter(candles=candles)
+        if his_data is not None:
+            histories.append((ticket_name, his_data))
+
+    return histories
+
+def cal_data_parallel(tickets_info: dict, start_date: datetime, all_data: dict, workers: int) -> dict:
+    """
+    fan the tickers of one day out to a forked pool in chunks , workers read all_data copy on write
+
+    return :
+        {ticket_name : history_price_group} in tickets_info order
+    """
+    global _chunk_data
+
+    names = list(tickets_info.keys())
+    chunks = [(start_date, names[start : start + TICKER_CHUNK]) for start in range(0, len(names), TICKER_CHUNK)]
+
+    _chunk_data = all_data
+    try:
+        with multiprocessing.get_context("fork").Pool(processes=workers) as pool:
+            histories = {}
+            for idx, chunk_histories in enumerate(pool.imap(evaluate_chunk, chunks)):
+                histories.update(chunk_histories)
+                print(f" cal process chunk ({idx+1}/{len(chunks)}) , {len(histories)} stocks")
+    finally:
+        _chunk_data = None
+
+    return histories
+
 @staticmethod
-def cal_data(tickets_info: dict, start_date: datetime, all_data: dict , range = 10):
+def cal_data(tickets_info: dict, start_date: datetime, all_data: dict , range = 10, workers = 1):
+    """
+    workers : > 1 evaluates the tickers on a process pool, the industry grouping stays here
+    """
+
+    if workers > 1:
+        histories = cal_data_parallel(tickets_info=tickets_info, start_date=start_date, all_data=all_data, workers=workers)
+        return build_market_result(tickets_info=tickets_info, histories=histories, start_date=start_date, range=range)
 
     total_stocks = len(tickets_info.keys())
 
-    market_result = market_group()
+    histories = {}
     for idx, ticket_name in enumerate(tickets_info.keys()):
         print(f" [{ticket_name}] cal process ({idx+1}/{total_stocks})")
 
@@ -167,6 +282,38 @@ def cal_data(tickets_info: dict, start_date: datetime, all_data: dict , range =
         print("ticket name ", ticket_name)
         print(his_data)
 
+        histories[ticket_name] = his_data
+
+    return build_market_result(tickets_info=tickets_info, histories=histories, start_date=start_date, range=range)
+
+def industry_report_row(industry_data: industry_group) -> dict:
+    """
+    one industry of one day , the columns of report/ath_model_<day>.csv and classic/ath_model_<industry>.csv
+    """
+    return {
+        "break_high_group": " ,".join(industry_data.break_high_group),
+        "break_low_group": " ,".join(industry_data.break_low_group),
+        "approach_high": " ,".join(industry_data.approach_high),
+        "ath_count": industry_data.ath_count,
+        "atl_count": industry_data.atl_count,
+        "approach_count" : len(industry_data.approach_high),
+        "ath_ratio": str(round(industry_data.ath_count / industry_data.total_stocks,2)),
+        "atl_ratio": str(round(industry_data.atl_count / industry_data.total_stocks,2)),
+        "approach_ratio": str(round( len(industry_data.approach_high) / industry_data.total_stocks,2)), 
+        "weekly_chagne" : str(round( industry_data.week_change_avg / industry_data.total_stocks,2)), 
+        "total_stocks" : industry_data.total_stocks,
+    }
+
+def build_market_result(tickets_info: dict, histories: dict, start_date: datetime, range = 10):
+    """
+    group one day of history_price_group by industry and write report/ath_model_<day>.csv
+
+    input :
+        1. histories : {ticket_name : history_price_group} , in tickets_info order
+    """
+
+    market_result = market_group()
+    for ticket_name, his_data in histories.items():
         industry = tickets_info[ticket_name]["industry"]
 
         if industry not in market_result.industry:
@@ -181,6 +328,7 @@ def cal_data(tickets_info: dict, start_date: datetime, all_data: dict , range =
         #     approach_high : list = []
 
         market_result.industry[industry].stock[ticket_name] = his_data
+        market_result.industry[industry].total_stocks += 1
 
         if his_data.break_high_today:
             market_result.industry[industry].ath_count += 1
@@ -207,30 +355,14 @@ def cal_data(tickets_info: dict, start_date: datetime, all_data: dict , range =
     ath_count = 0
     atl_count = 0
 
-    allDF = pd.DataFrame()
-    dfs = []
+    report = ReportBuilder()
 
     for industry_name, industry_data in market_result.industry.items():
         data = {}
         data["industry_name"] = industry_name
-        data.update(
-            {
-                "break_high_group": " ,".join(industry_data.break_high_group),
-                "break_low_group": " ,".join(industry_data.break_low_group),
-                "approach_high": " ,".join(industry_data.approach_high),
-                "ath_count": industry_data.ath_count,
-                "atl_count": industry_data.atl_count,
-                "approach_count" : len(industry_data.approach_high),
-                "ath_ratio": str(round(industry_data.ath_count / len(industry_data.stock.keys()),2)),
-                "atl_ratio": str(round(industry_data.atl_count / len(industry_data.stock.keys()),2)),
-                "approach_ratio": str(round( len(industry_data.approach_high) / len(industry_data.stock.keys()),2)), 
-                "weekly_chagne" : str(round( industry_data.week_change_avg / len(industry_data.stock.keys()),2)), 
-                "total_stocks" : len(industry_data.stock.keys()),
-            }
-        )
+        data.update(industry_report_row(industry_data))
 
-        df = pd.DataFrame(data, index=[0])
-        dfs.append(df)
+        report.append(data)
 
         ath_list[industry_name] = industry_data.ath_count
         atl_list[industry_name] = industry_data.atl_count
@@ -238,10 +370,10 @@ def cal_data(tickets_info: dict, start_date: datetime, all_data: dict , range =
         ath_count += industry_data.ath_count
         atl_count += industry_data.atl_count
 
-    if not dfs:
+    if not len(report):
         return None    
 
-    allDF = pd.concat(dfs, ignore_index=True)
+    allDF = report.to_frame()
 
     today = start_date.strftime("%Y-%m-%d")
     file_name = "ath_model_" + today + ".csv"
@@ -263,13 +395,7 @@ def cal_data(tickets_info: dict, start_date: datetime, all_data: dict , range =
     return market_result  
 
 def cal_spy(start_date: datetime , reuse_data : bool = False) -> history_price_group:
-    SPY_DATA_FILE = "spy_price.json"
-
-    if not os.path.exists("spy_price.json") or not reuse_data:
-        ticket_candles = load_prices_from_yahoo(ticket_name='SPY')._asdict()
-        save_to_json(data=ticket_candles,json_file_path=SPY_DATA_FILE)
-    else:
-        ticket_candles = read_from_json(SPY_DATA_FILE)
+    ticket_candles = get_benchmark("SPY", reuse_data=reuse_data)
 
     candles = slice_data(
         start_date=start_date, ticket_candles=ticket_candles
@@ -289,9 +415,6 @@ def get_week_start_and_end(start_date : datetime) -> tuple:
     monday += timedelta(hours=8)
     friday += timedelta(hours=8)
 
-    print(f"monday = {monday}")
-    print(f"friday = {friday}")
-
     # if  start_date_friday is None or start_date_friday.weekday() != 4:
     #     #today = datetime.today().replace(hour=0, minute=0, second=0, microsecond=0)
     #     today = start_date_friday.replace(hour=0, minute=0, second=0, microsecond=0)
@@ -307,28 +430,27 @@ def get_week_start_and_end(start_date : datetime) -> tuple:
 
     return (monday.timestamp(), friday.timestamp())
 
+def to_trading_day_index(ticket_candles: dict) -> dict:
+    """
+    candles.json layout to numpy arrays, the sorted timestamps are the trading day index of slice_data
+    """
+    return {column : np.asarray(values) for column, values in ticket_candles.items()}
+
 @staticmethod
 def slice_data(start_date: datetime, ticket_candles: dict):
+    """
+    ticket_candles : numpy arrays from to_trading_day_index
+
+    return :
+        views of every bar up to start_date, None when start_date has no bar
+    """
 
-    index = 0
     start_date_timestamp = start_date.timestamp()
-    monday_timestamp , _ = get_week_start_and_end(start_date=start_date)
-    monday_datetime = datetime.fromtimestamp(monday_timestamp)
-    print(f"monday_datetime : {monday_datetime}")
-    while True:
-        
-        now_date = datetime.fromtimestamp(start_date_timestamp)
-        print(f"now_date : {now_date} , {start_date_timestamp}")
-        if now_date < monday_datetime:
-            return None
+    timestamps = ticket_candles["timestamps"]
 
-        if start_date_timestamp in ticket_candles["timestamps"]:
-            index = ticket_candles["timestamps"].index(start_date_timestamp)
-            print(f"index = {index} , day = {datetime.fromtimestamp(start_date_timestamp)}")
-            break
-        else:
-            return None
-            #start_date_timestamp -= 86400
+    index = int(np.searchsorted(timestamps, start_date_timestamp))
+    if index == len(timestamps) or timestamps[index] != start_date_timestamp:
+        return None
 
     return sliced_candle_info(
         opens=ticket_candles["opens"][: index + 1],
@@ -336,11 +458,28 @@ def slice_data(start_date: datetime, ticket_candles: dict):
         lows=ticket_candles["lows"][: index + 1],
         highs=ticket_candles["highs"][: index + 1],
         volumes=ticket_candles["volumes"][: index + 1],
-        timestamps=ticket_candles["timestamps"][: index + 1],
+        timestamps=timestamps[: index + 1],
         this_week=get_week_start_and_end(start_date=start_date),
-        today=start_date.timestamp(),
+        today=start_date_timestamp,
     )
 
+def trading_days(start_date: datetime, end_date: datetime) -> list:
+    """
+    the simulated days of Ath_model.run , friday jumps to the next monday
+    """
+
+    days = []
+    day = start_date
+    while day <= end_date:
+        days.append(day)
+
+        if day.weekday() == 4:
+            day = day + timedelta(days=3)
+        else:
+            day = day + timedelta(days=1)
+
+    return days
+
 def relative_strength(season_change :list , season_weight , season_min):
     none_count = season_change.count(None)
 
@@ -411,14 +550,23 @@ def gen_rs_report(start_date,weekly_result:market_group,gap_range = 10,reuse_dat
                                    industry_name,
                                    stock_history_data.seasons_change)
 
-    rs_dataframe = []
+    if not rs_list:
+        print(f"{start_date.strftime('%Y-%m-%d')} : no stock beats spy , no rs report")
+        return
+
+    rs_dataframe = ReportBuilder()
 
     season_weight = []
     season_min = []
 
     for i in range(4):
-        season_min.append(min(season_total[i]))
-        season_weight.append(abs(max(season_total[i])-min(season_total[i])))
+        # a season nobody has, or everybody has at the same change, would stop the whole backtest
+        if season_total[i]:
+            season_min.append(min(season_total[i]))
+            season_weight.append(abs(max(season_total[i])-min(season_total[i])) or 1)
+        else:
+            season_min.append(0)
+            season_weight.append(1)
 
     
     for name , data in rs_list.items():
@@ -434,19 +582,24 @@ def gen_rs_report(start_date,weekly_result:market_group,gap_range = 10,reuse_dat
                "industry_name" : data[7],
                "relative_strength" : relative_strength(season_change=data[8],season_weight=season_weight,season_min=season_min),
                }
-        df = pd.DataFrame(tmp, index=[0])
-        rs_dataframe.append(df)
+        rs_dataframe.append(tmp)
 
     # 1. 合併資料
-    ALLDF = pd.concat(rs_dataframe, ignore_index=True)
-    
+    ALLDF = rs_dataframe.to_frame()
+
+    save_rs_report(ALLDF=ALLDF, start_date=start_date)
+
+def save_rs_report(ALLDF : pd.DataFrame, start_date : datetime):
+    """
+    filter, rank and write rs_report/rs_model_<day>.csv
+    """
+
     # 2. 過濾異常值與特定產業
     # 移除相對強度為 -1 的異常值
     ALLDF = ALLDF[ALLDF['relative_strength'] != -1].copy()
     
     # 排除特定產業 (Bio, Medical, Drug, Health, Diagnostics, Banks Regional)
-    exclude_keywords = 'Bio|Medical|Drug|Health|Diagnostics|Banks|REIT|Utilities|Gold|Silver|Precious|Asset Management'
-    bad_sector_mask = ALLDF['industry_name'].str.contains(exclude_keywords, case=False, na=False)
+    bad_sector_mask = ALLDF['industry_name'].str.contains(EXCLUDE_INDUSTRIES, case=False, na=False)
     ALLDF = ALLDF[~bad_sector_mask].copy() # 使用 ~ 取反向，只保留不含這些關鍵字的資料
     
     # 3. 排序 (必須先排序，這樣 rank 才是根據強度給予的)
@@ -477,88 +630,186 @@ class Ath_model:
     within the period from start_date to end_date.
     '''
 
-    def __init__(self,start_date : datetime , end_date : datetime , marketCap = MARKET_CAP_100E ,gap_to_high_range = 10 , reuse_data = False) -> None:
-        self.stocks_info : dict = get_total_stocks_basic_info(marketCap=marketCap,reuse_data=reuse_data)
-        self.stocks_price_data : dict = get_stock_history_price_data(self.stocks_info,reuse_data=reuse_data)
+    def __init__(self,start_date : datetime , end_date : datetime , marketCap = MARKET_CAP_100E ,gap_to_high_range = 10 , reuse_data = False , incremental = False , validate = True) -> None:
+        self.stocks_info : dict = get_total_stocks_basic_info(marketCap=marketCap,reuse_data=reuse_data,incremental=incremental)
+        self.stocks_price_data : dict = get_stock_history_price_data(self.stocks_info,reuse_data=reuse_data,incremental=incremental)
+        # a ticker listed after the last sync has no stored candles yet
+        self.stocks_info = {name : info for name, info in self.stocks_info.items() if name in self.stocks_price_data}
+
+        if validate:
+            # bad series are dropped once here instead of failing every simulated day ,
+            # only the bars the simulated days read (a year before start_date up to end_date) are checked
+            quarantine = save_quarantine(validate_candles(all_candles=self.stocks_price_data,
+                                                          since=start_date.timestamp(),
+                                                          until=end_date.timestamp(),
+                                                          lookback_bars=WEEKLY_52_BAR - 1))
+            self.stocks_info = {name : info for name, info in self.stocks_info.items() if name not in quarantine}
+
+        self.stocks_price_data = {name : to_trading_day_index(self.stocks_price_data[name]) for name in self.stocks_info}
         self.start_date = start_date
         self.end_date = end_date    
         self.range = gap_to_high_range
         self.marketCap = marketCap
         self.reuse_data = reuse_data
-
-    def run(self):
-
-        day = self.start_date
-        history = []
-        weekly_list = []
-        while True:
-            if day > self.end_date:
-                break
-            weekly_result = cal_data(tickets_info=self.stocks_info,
-                                     start_date=day,
-                                     all_data=self.stocks_price_data,
-                                     range=self.range)
-            
+        self.panel = None
+
+    def price_panel(self):
+        """
+        PricePanel of the whole backtest , built once for the panel engine and the parameter sweep
+        """
+        if self.panel is None:
+            # price_panel imports this module
+            from price_panel import PricePanel
+            self.panel = PricePanel(all_data=self.stocks_price_data, tickets_info=self.stocks_info, since=self.start_date)
+        return self.panel
+
+    def daily_results(self, days : list, rolling = False, ticker_workers = 1, panel = False):
+        """
+        rolling : evaluate every day with the single pass engine of backtest_engine instead of cal_data
+        ticker_workers : process pool of cal_data for the tickers of one day
+        panel : evaluate every day as column operations of the PricePanel instead of cal_data
+
+        yield :
+            (day , market_group or None)
+        """
+
+        if panel:
+            price_panel = self.price_panel()
+            for day in days:
+                histories = price_panel.histories(day)
+                print(f"{datetime.strftime(day, '%Y-%m-%d')} : {len(histories)} stocks")
+                yield day, build_market_result(tickets_info=self.stocks_info, histories=histories, start_date=day, range=self.range)
+        elif rolling:
+            # backtest_engine imports this module
+            from backtest_engine import rolling_history
+
+            for day, histories in rolling_history(tickets_info=self.stocks_info, all_data=self.stocks_price_data, days=days):
+                yield day, build_market_result(tickets_info=self.stocks_info, histories=histories, start_date=day, range=self.range)
+        else:
+            for day in days:
+                yield day, cal_data(tickets_info=self.stocks_info,
+                                    start_date=day,
+                                    all_data=self.stocks_price_data,
+                                    range=self.range,
+                                    workers=ticker_workers)
+
+    def report_day(self, day : datetime, weekly_result : market_group) -> tuple:
+        """
+        write the rs report of one day
+
+        return :
+            (datasheet.csv row , {industry_name : classic row})
+        """
+
+        gen_rs_report(start_date=day,weekly_result=weekly_result,gap_range=self.range,reuse_data=self.reuse_data)
+        weekly_result.compact()
+
+        daystring = day.strftime("%Y-%m-%d")
+        row = {
+            "start_date": daystring,
+            "ath_count": weekly_result.ath_count,
+            "atl_count": weekly_result.atl_count,
+        }
+
+        classic = {
+            industry_name : {"datetime" : daystring, **industry_report_row(industry_data)}
+            for industry_name, industry_data in weekly_result.industry.items()
+        }
+
+        return row, classic
+
+    def evaluate(self, days : list, rolling = False, ticker_workers = 1, panel = False):
+        """
+        yield :
+            report_day of every day with a result , in date order
+        """
+        for day, weekly_result in self.daily_results(days, rolling, ticker_workers, panel):
             if weekly_result:
-            
-                weekly_list.append((day.strftime("%Y-%m-%d"),weekly_result))
-                gen_rs_report(start_date=day,weekly_result=weekly_result,gap_range=self.range,reuse_data=self.reuse_data)
-
-                tmp = {
-                    "start_date": day.strftime("%Y-%m-%d"),
-                    "ath_count": weekly_result.ath_count,
-                    "atl_count": weekly_result.atl_count,
-                }
-
-
-                df = pd.DataFrame(tmp, index=[0])
-                history.append(df)
-
-            if day.weekday() == 4:
-                day = day + timedelta(days=3)
-            else:
-                day = day + timedelta(days=1)
+                yield self.report_day(day, weekly_result)
+
+    def checkpoint_key(self) -> dict:
+        """
+        a checkpoint only resumes the same backtest
+        """
+        return {
+            "start_date": self.start_date.strftime("%Y-%m-%d"),
+            "end_date": self.end_date.strftime("%Y-%m-%d"),
+            "gap_to_high_range": self.range,
+            "marketCap": self.marketCap,
+        }
+
+    def load_checkpoint(self) -> str:
+        """
+        return :
+            last finished day ("YYYY-MM-DD") of the checkpoint , None without a checkpoint of this backtest
+        """
+        if not os.path.exists(CHECKPOINT_JSON):
+            return None
 
-        allDF = pd.concat(history, ignore_index=True)
-        file_name  = "datasheet.csv"
-        exist_data = pd.read_csv(file_name)
-        allDF = pd.concat([exist_data,allDF],ignore_index=True)
-        allDF.to_csv(file_name, index=False)
+        checkpoint = read_from_json(CHECKPOINT_JSON)
+        if checkpoint["key"] != self.checkpoint_key():
+            print(f"{CHECKPOINT_JSON} belongs to another backtest , start over")
+            return None
 
+        print(f"resume after {checkpoint['last_day']} ({checkpoint['finished_days']} days finished)")
+        return checkpoint["last_day"]
+
+    def save_checkpoint(self, last_day : str, finished_days : int) -> None:
+        save_to_json(data={
+            "key": self.checkpoint_key(),
+            "last_day": last_day,
+            "finished_days": finished_days,
+        }, json_file_path=CHECKPOINT_JSON)
+
+    def run(self, rolling = False, workers = 1, ticker_workers = 1, resume = False, panel = False):
+        """
+        rolling : single pass engine instead of cal_data
+        panel : PricePanel column operations instead of cal_data
+        workers : > 1 splits the days into shards over a process pool (backtest_engine.parallel_evaluate)
+        ticker_workers : > 1 splits the tickers of every day over a process pool (short runs like daily_run)
+        resume : skip the days of the last checkpoint of this backtest and its days already in datasheet.csv
+        """
+
+        days = trading_days(self.start_date, self.end_date)
+        datasheet = CsvAppender(path=DATASHEET_CSV, key="start_date")
+
+        finished_days = 0
+        if resume:
+            last_day = self.load_checkpoint()
+            # without a checkpoint of this backtest the datasheet rows may come from another one
+            if last_day is not None:
+                datasheet.load()
+                remaining = [
+                    day for day in days
+                    if day.strftime("%Y-%m-%d") > last_day and day.strftime("%Y-%m-%d") not in datasheet.seen
+                ]
+                finished_days = len(days) - len(remaining)
+                days = remaining
+
+        if workers > 1:
+            from backtest_engine import parallel_evaluate
+            daily_rows = parallel_evaluate(model=self, days=days, rolling=rolling, workers=workers, panel=panel)
+        else:
+            daily_rows = self.evaluate(days, rolling, ticker_workers, panel)
 
+        # every finished day is appended right away, memory stays flat and a crash keeps the finished days.
+        # the datasheet row goes last, a day in datasheet.csv has all of its outputs
         classic = {}
-        for daystring , weekly_result in weekly_list:
-            
-            for industry_name, industry_data in weekly_result.industry.items():
+        for row , industries in daily_rows:
+
+            for industry_name, tmp in industries.items():
                 
                 if industry_name not in classic:
-                    classic[industry_name] = []
-            
-
-                tmp = {
-                    "datetime" : daystring,
-                    "break_high_group": " ,".join(industry_data.break_high_group),
-                    "break_low_group": " ,".join(industry_data.break_low_group),
-                    "approach_high": " ,".join(industry_data.approach_high),
-                    "ath_count": industry_data.ath_count,
-                    "atl_count": industry_data.atl_count,
-                    "approach_count" : len(industry_data.approach_high),
-                    "ath_ratio": str(round(industry_data.ath_count / len(industry_data.stock.keys()),2)),
-                    "atl_ratio": str(round(industry_data.atl_count / len(industry_data.stock.keys()),2)),
-                    "approach_ratio": str(round( len(industry_data.approach_high) / len(industry_data.stock.keys()),2)), 
-                    "weekly_chagne" : str(round( industry_data.week_change_avg / len(industry_data.stock.keys()),2)), 
-                    "total_stocks" : len(industry_data.stock.keys()),
-                }
+                    file_name = "ath_model_" + industry_name + ".csv"
+                    classic[industry_name] = CsvAppender(path=os.path.join("classic",file_name), key="datetime")
                 
-                df = pd.DataFrame(tmp, index=[0])
-                classic[industry_name].append(df)
+                classic[industry_name].append(tmp)
 
-        for industry_name, data in classic.items():
-            print(data)
-            ALLDF = pd.concat(data, ignore_index=True)
-            name  = industry_name
-            file_name = "ath_model_" + name + ".csv"
-            file_name = os.path.join("classic",file_name)
-            ALLDF.to_csv(file_name, index=False)
+            datasheet.append(row)
 
+            finished_days += 1
+            if finished_days % CHECKPOINT_DAYS == 0:
+                self.save_checkpoint(last_day=row["start_date"], finished_days=finished_days)
 
+        if days:
+            self.save_checkpoint(last_day=days[-1].strftime("%Y-%m-%d"), finished_days=finished_days)
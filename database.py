@@ -1,7 +1,54 @@
+import os
 import sqlite3
 import system_log
 from typing import final
 
+FEATURE_DATABASE_PATH = os.path.join(os.path.dirname(__file__), "database", "feature_store.db")
+
+# column : sqlite type of the daily feature table , (ticker , date) is the key
+FEATURE_COLUMNS = {
+    "ticker": "TEXT NOT NULL",
+    "date": "DATE NOT NULL",
+    "bars": "INTEGER",
+    "open": "REAL",
+    "high": "REAL",
+    "low": "REAL",
+    "close": "REAL",
+    "volume": "REAL",
+    "weekly_52_high": "REAL",
+    "weekly_52_low": "REAL",
+    "gap_from_the_last_high": "REAL",
+    "break_high": "INTEGER",
+    "break_low": "INTEGER",
+    "break_high_today": "INTEGER",
+    "break_low_today": "INTEGER",
+    "ma_5": "REAL",
+    "ma_10": "REAL",
+    "ma_20": "REAL",
+    "ma_50": "REAL",
+    "ma_100": "REAL",
+    "ma_150": "REAL",
+    "ma_200": "REAL",
+    "volume_ma_5": "REAL",
+    "volume_ma_20": "REAL",
+    "big_volume": "INTEGER",
+    "above_all_moving_avg_line": "INTEGER",
+    "volatility": "REAL",
+    "weekly_change": "REAL",
+    "yearly_change": "REAL",
+    "season_4": "REAL",
+    "season_3": "REAL",
+    "season_2": "REAL",
+    "season_1": "REAL",
+    "avg_turnover_30": "REAL",
+    "ema_10": "REAL",
+    "atr_14": "REAL",
+    "week_open": "REAL",
+    "week_high": "REAL",
+    "week_low": "REAL",
+    "prev_week_close": "REAL",
+}
+
 
 class Database:
     def __init__(self, db_name : str) -> None:
@@ -73,6 +120,105 @@ class OpenInterest_database(Database):
         """, (current_date,))
         self.connection.commit()
 
+@final
+class Feature_database(Database):
+    """
+    daily technical features of every ticker , one row per (ticker , date)
+    season_1 is the change of the current season (last 63 bars) , season_4 of the season a year ago
+    """
+
+    def initialize_db(self):
+        columns = ",\n".join(f"{name} {sql_type}" for name, sql_type in FEATURE_COLUMNS.items())
+        self.cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS features (
+            {columns},
+            PRIMARY KEY (ticker, date)
+        ) WITHOUT ROWID;
+        """)
+
+        # the primary key serves a ticker and its date ranges , this one a whole market day
+        self.cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_features_date ON features (date);
+        """)
+        self.connection.commit()
+
+    def rows_as_dicts(self) -> list:
+        names = [column[0] for column in self.cursor.description]
+        return [dict(zip(names, row)) for row in self.cursor.fetchall()]
+
+    def upsert_rows(self, rows: list):
+        """
+        rows : tuples in FEATURE_COLUMNS order
+        """
+        names = ", ".join(FEATURE_COLUMNS)
+        marks = ", ".join("?" for _ in FEATURE_COLUMNS)
+        self.cursor.executemany(f"""
+        INSERT OR REPLACE INTO features ({names}) VALUES ({marks});
+        """, rows)
+        self.connection.commit()
+
+    def delete_ticker(self, ticker):
+        self.cursor.execute("""
+        DELETE FROM features WHERE ticker = ?;
+        """, (ticker,))
+        self.connection.commit()
+
+    def last_rows(self) -> dict:
+        """
+        return :
+            {ticker : (last stored date , close of that date)}
+        """
+        self.cursor.execute("""
+        SELECT f.ticker, f.date, f.close FROM features f
+        JOIN (SELECT ticker, MAX(date) AS date FROM features GROUP BY ticker) l
+        ON f.ticker = l.ticker AND f.date = l.date;
+        """)
+        return {ticker : (date, close) for ticker, date, close in self.cursor.fetchall()}
+
+    def last_date(self):
+        self.cursor.execute("""
+        SELECT MAX(date) FROM features;
+        """)
+        return self.cursor.fetchone()[0]
+
+    def query_point(self, ticker, date):
+        self.cursor.execute("""
+        SELECT * FROM features WHERE ticker = ? AND date = ?;
+        """, (ticker, date))
+        rows = self.rows_as_dicts()
+        return rows[0] if rows else None
+
+    def query_range(self, ticker, start_date, end_date):
+        """
+        start_date , end_date : "YYYY-MM-DD"
+        """
+        self.cursor.execute("""
+        SELECT * FROM features WHERE ticker = ? AND date BETWEEN ? AND ?
+        ORDER BY date;
+        """, (ticker, start_date, end_date))
+        return self.rows_as_dicts()
+
+    def query_day(self, date):
+        self.cursor.execute("""
+        SELECT * FROM features WHERE date = ?;
+        """, (date,))
+        return self.rows_as_dicts()
+
+    def query_latest(self, tickers) -> dict:
+        """
+        return :
+            {ticker : row of its last stored date} , tickers missing in the store are left out
+        """
+        latest = {}
+        for ticker in tickers:
+            self.cursor.execute("""
+            SELECT * FROM features WHERE ticker = ? ORDER BY date DESC LIMIT 1;
+            """, (ticker,))
+            rows = self.rows_as_dicts()
+            if rows:
+                latest[ticker] = rows[0]
+        return latest
+
 
 if __name__ == "__main__":
     # 插入範例數據
@@ -1,9 +1,9 @@
 # 假設已存在的自定義模組
 from stock_rules import rs_above_90
 from file_io import read_stock_info_json
+from database import Feature_database , FEATURE_DATABASE_PATH
 
 import pandas as pd
-import yfinance as yf
 from datetime import datetime, timedelta
 
 def get_stock_analysis_df():
@@ -12,9 +12,6 @@ def get_stock_analysis_df():
     monday = today - timedelta(days=today.weekday())
     friday = monday + timedelta(days=4)
     
-    # 抓取範圍：從本週一往前推 10 天，確保含括上週最後交易日
-    yf_start_capture = (monday - timedelta(days=10)).strftime('%Y-%m-%d')
-    yf_end_capture = (friday + timedelta(days=1)).strftime('%Y-%m-%d')
     this_week_start_str = monday.strftime('%Y-%m-%d')
 
     print(f"📅 報告生成日期: {today.strftime('%Y-%m-%d %H:%M')}")
@@ -28,29 +25,28 @@ def get_stock_analysis_df():
         print(f"❌ 讀取配置失敗: {e}")
         return None, None
 
-    # --- 3. 抓取數據 ---
-    data_raw = yf.download(stocks, start=yf_start_capture, end=yf_end_capture, auto_adjust=True, group_by='ticker')
+    # --- 3. 讀取特徵庫 (每晚 daily_run 更新的週 K 欄位) ---
+    with Feature_database(db_name=FEATURE_DATABASE_PATH) as db:
+        features = db.query_latest(tickers=stocks)
 
     stock_results = []
 
     for s in stocks:
         try:
-            df = data_raw[s].dropna()
-            if df.empty: continue
+            row = features.get(s)
+            if row is None: continue
 
             # 定義本週資料與基準日
-            this_week_df = df.loc[this_week_start_str:]
-            if len(this_week_df) < 1: continue
+            if row['date'] < this_week_start_str: continue
 
             # 找到上一個有效交易日的收盤價
-            first_day_idx = df.index.get_loc(this_week_df.index[0])
-            prev_close = df.iloc[first_day_idx - 1]['Close'] if first_day_idx > 0 else this_week_df.iloc[0]['Open']
+            prev_close = row['prev_week_close'] if row['prev_week_close'] is not None else row['week_open']
 
             # 本週數據
-            curr_open = this_week_df.iloc[0]['Open']
-            curr_close = this_week_df.iloc[-1]['Close']
-            hi = this_week_df['High'].max()
-            lo = this_week_df['Low'].min()
+            curr_open = row['week_open']
+            curr_close = row['close']
+            hi = row['week_high']
+            lo = row['week_low']
 
             # 指標計算
             body_move = curr_close - curr_open
@@ -0,0 +1,224 @@
+"""
+File : feature_store.py
+persistent daily feature store , the indicators of every ticker computed once per bar and kept in sqlite
+
+    update_feature_store(all_candles) : append the bars after the last stored date of every ticker (nightly)
+    Feature_database (database.py) : point , range and market day queries for the screens
+
+the values follow history_price_filter (52 week extremes , moving averages , volatility , season changes)
+and tradingview_list (turnover , ema , atr) , the week columns serve efficient_stock.
+"""
+
+import os
+import math
+import numpy as np
+import pandas as pd
+from database import Feature_database, FEATURE_DATABASE_PATH, FEATURE_COLUMNS
+from data_analysis import WEEKLY_52_BAR, SEASON_BAR, settle_moving_averages
+from backtest_engine import trailing_windows, last_moving_averages, rolling_volatility, MOVING_AVG_WEIGHTS, VOLUME_AVG_WEIGHTS
+
+DAY = 86400
+FIRST_BUILD_BARS = WEEKLY_52_BAR    # bars stored for a ticker new to the store , None stores the whole history
+TURNOVER_BARS = 30
+EMA_SPAN = 10
+ATR_BARS = 14
+ADJUST_TOLERANCE = 1e-4             # a stored close that moved this much means the history was adjusted
+
+
+def week_start(timestamps: np.ndarray) -> np.ndarray:
+    """
+    utc midnight timestamp of the monday of every timestamp (1970-01-01 is a thursday)
+    """
+    return timestamps - ((timestamps // DAY + 3) % 7) * DAY
+
+
+def ticker_features(candles: dict, first: int) -> dict:
+    """
+    input :
+        1. candles : {column : array} of one ticker (candles.json layout or to_trading_day_index)
+        2. first : first bar to compute , the bars before it are only history
+
+    return :
+        {FEATURE_COLUMNS column : array over the bars first .. last} , None when there is nothing to compute
+    """
+
+    timestamps = np.asarray(candles["timestamps"], dtype=np.int64)
+    count = len(timestamps)
+    if first >= count:
+        return None
+
+    opens = np.asarray(candles["opens"], dtype=np.float64)
+    highs = np.asarray(candles["highs"], dtype=np.float64)
+    lows = np.asarray(candles["lows"], dtype=np.float64)
+    closes = np.asarray(candles["closes"], dtype=np.float64)
+    volumes = np.asarray(candles["volumes"], dtype=np.float64)
+    positions = np.arange(first, count)
+
+    # history_price_filter of every bar
+    starts = np.maximum(positions - WEEKLY_52_BAR + 1, 0)
+    lengths = positions - starts + 1
+    high_index = positions - WEEKLY_52_BAR + 1 + trailing_windows(closes, positions, WEEKLY_52_BAR, -np.inf).argmax(axis=1)
+    low_index = positions - WEEKLY_52_BAR + 1 + trailing_windows(closes, positions, WEEKLY_52_BAR, np.inf).argmin(axis=1)
+    weekly_52_high = closes[high_index]
+    weekly_52_low = closes[low_index]
+    last_close = closes[positions]
+
+    averages = settle_moving_averages(last_close, {weight: last_moving_averages(closes, positions, weight) for weight in MOVING_AVG_WEIGHTS},
+                                      lambda row: closes[starts[row] : positions[row] + 1])
+    volume_averages = settle_moving_averages(volumes[positions], {weight: last_moving_averages(volumes, positions, weight) for weight in VOLUME_AVG_WEIGHTS},
+                                             lambda row: volumes[starts[row] : positions[row] + 1])
+    above_all = np.all([last_close >= averages[weight] for weight in MOVING_AVG_WEIGHTS], axis=0)
+    above_all &= (last_close > averages[20]) & (averages[20] > averages[50]) & (averages[50] > averages[200])
+    big_volume = (volumes[positions] > volume_averages[5]) & (volumes[positions] > volume_averages[20])
+
+    monday = week_start(timestamps)
+    this_monday = monday[positions]
+    # last bar before this week , weekly_change only counts it when it is in last week (last_friday_index)
+    prev_week = np.searchsorted(timestamps, this_monday) - 1
+    prev_week_close = np.where(prev_week >= 0, closes[np.maximum(prev_week, 0)], np.nan)
+    in_last_week = (prev_week >= 0) & (timestamps[np.maximum(prev_week, 0)] >= this_monday - 7 * DAY)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        gap = ((weekly_52_high - last_close) / weekly_52_high) * 100
+        weekly_change = np.where(in_last_week, ((last_close / prev_week_close) - 1) * 100, 0)
+        # yearly_change , from the 52 week low or from the first bar when it is lower
+        yearly_base = np.where(closes[starts] < weekly_52_low, closes[starts], weekly_52_low)
+        yearly = ((last_close / yearly_base) - 1) * 100
+
+    frame = pd.DataFrame({"open": opens, "high": highs, "low": lows, "close": closes, "volume": volumes, "week": monday})
+    week = frame.groupby("week")
+    previous_close = frame["close"].shift(1)
+    true_range = pd.concat([
+        frame["high"] - frame["low"],
+        (frame["high"] - previous_close).abs(),
+        (frame["low"] - previous_close).abs(),
+    ], axis=1).max(axis=1)
+
+    features = {
+        "date": np.datetime_as_string(timestamps[positions].astype("datetime64[s]"), unit="D"),
+        "bars": positions + 1,
+        "open": opens[positions],
+        "high": highs[positions],
+        "low": lows[positions],
+        "close": last_close,
+        "volume": volumes[positions],
+        "weekly_52_high": weekly_52_high,
+        "weekly_52_low": weekly_52_low,
+        "gap_from_the_last_high": [round(value, 2) for value in gap.tolist()],
+        "break_high": timestamps[high_index] >= this_monday,
+        "break_low": timestamps[low_index] >= this_monday,
+        "break_high_today": high_index == positions,
+        "break_low_today": low_index == positions,
+        "volume_ma_5": volume_averages[5],
+        "volume_ma_20": volume_averages[20],
+        "big_volume": big_volume,
+        "above_all_moving_avg_line": above_all,
+        "volatility": [float(value) for value in rolling_volatility(opens, closes, low_index, positions)],
+        "weekly_change": [round(value, 2) for value in weekly_change.tolist()],
+        "yearly_change": [round(value, 2) for value in yearly.tolist()],
+        # a young listing is averaged over the bars it has (min(30, bars) of tradingview_list)
+        "avg_turnover_30": (frame["close"] * frame["volume"]).rolling(window=TURNOVER_BARS, min_periods=1).mean().to_numpy()[positions],
+        "ema_10": frame["close"].ewm(span=EMA_SPAN, adjust=False).mean().to_numpy()[positions],
+        "atr_14": true_range.rolling(window=ATR_BARS).mean().to_numpy()[positions],
+        "week_open": week["open"].transform("first").to_numpy()[positions],
+        "week_high": week["high"].cummax().to_numpy()[positions],
+        "week_low": week["low"].cummin().to_numpy()[positions],
+        "prev_week_close": prev_week_close,
+    }
+
+    # a moving average without its whole window is 0 in history_price_filter , null here
+    for weight in MOVING_AVG_WEIGHTS:
+        features[f"ma_{weight}"] = np.where(averages[weight] == 0, np.nan, averages[weight])
+
+    for season in range(4, 0, -1):
+        season_first = np.maximum(positions + 1 - SEASON_BAR * season, 0)
+        season_last = np.minimum(season_first + SEASON_BAR - 1, count - 1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            change = ((closes[season_last] / closes[season_first]) - 1) * 100
+        features[f"season_{season}"] = np.where(lengths >= SEASON_BAR * season, [round(value, 2) for value in change.tolist()], np.nan)
+
+    return features
+
+
+def to_sql_value(value):
+    """
+    numpy scalars to python values , nan to null
+    """
+    if isinstance(value, (bool, np.bool_)):
+        return int(value)
+    if isinstance(value, (np.integer,)):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        return None if math.isnan(value) else float(value)
+    return value
+
+
+def feature_rows(ticker: str, features: dict) -> list:
+    """
+    return :
+        tuples in FEATURE_COLUMNS order for Feature_database.upsert_rows
+    """
+    columns = [[ticker] * len(features["date"]) if name == "ticker" else list(features[name]) for name in FEATURE_COLUMNS]
+    return [tuple(to_sql_value(value) for value in row) for row in zip(*columns)]
+
+
+def first_new_bar(candles: dict, last_row: tuple) -> int:
+    """
+    first bar after the stored rows , -1 when the stored rows no longer match the candles (split , dividend)
+    """
+
+    timestamps = np.asarray(candles["timestamps"], dtype=np.int64)
+    if last_row is None:
+        return 0 if FIRST_BUILD_BARS is None else max(0, len(timestamps) - FIRST_BUILD_BARS)
+
+    last_date, last_close = last_row
+    last_timestamp = int(pd.Timestamp(last_date).timestamp())
+    index = int(np.searchsorted(timestamps, last_timestamp))
+    if index == len(timestamps) or timestamps[index] != last_timestamp:
+        return -1
+
+    close = float(candles["closes"][index])
+    if last_close is None or not math.isclose(close, last_close, rel_tol=ADJUST_TOLERANCE):
+        return -1
+
+    return index + 1
+
+
+def update_feature_store(all_candles: dict, db_path: str = FEATURE_DATABASE_PATH) -> int:
+    """
+    input :
+        1. all_candles : {ticker : {column : array}} , the whole history of every ticker
+        2. db_path : sqlite file of the store
+
+    return :
+        count of stored rows , a ticker whose history was adjusted is rebuilt from FIRST_BUILD_BARS
+    """
+
+    folder = os.path.dirname(db_path)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+
+    stored = 0
+    with Feature_database(db_name=db_path) as db:
+        last_rows = db.last_rows()
+
+        for ticker, candles in all_candles.items():
+            if not len(candles["timestamps"]):
+                continue
+
+            first = first_new_bar(candles, last_rows.get(ticker))
+            if first < 0:
+                print(f"{ticker} : history adjusted , rebuild its features")
+                db.delete_ticker(ticker)
+                first = first_new_bar(candles, None)
+
+            features = ticker_features(candles, first)
+            if features is None:
+                continue
+
+            rows = feature_rows(ticker, features)
+            db.upsert_rows(rows)
+            stored += len(rows)
+
+    print(f"feature store : {stored} rows stored")
+    return stored
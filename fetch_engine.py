@@ -0,0 +1,131 @@
+"""
+File : fetch_engine.py
+bounded concurrent fetch with token bucket rate limit
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from fetch_policy import FetchPolicy, RETRY_ROUNDS
+
+MAX_WORKERS = 8
+REQUEST_RATE = 4.0      # requests per second
+REQUEST_TIMEOUT = 30    # seconds
+
+
+class TokenBucket:
+    """
+    thread safe token bucket, acquire() blocks until a token is available
+    """
+
+    def __init__(self, rate: float, capacity: int = 1) -> None:
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait_time = (1 - self.tokens) / self.rate
+
+            time.sleep(wait_time)
+
+
+def concurrent_fetch(fetch, items: list, max_workers: int = MAX_WORKERS, rate: float = REQUEST_RATE, timeout: float = REQUEST_TIMEOUT, policy: FetchPolicy = None, rounds: int = RETRY_ROUNDS) -> dict:
+    """
+    input :
+        1. fetch : callable, fetch(item) -> result
+        2. items : items to fetch
+        3. max_workers : thread pool size
+        4. rate : max requests per second across all workers
+        5. timeout : seconds a single request may run before it is given up , its retries and backoff
+           stop there but a request already sent runs on in its thread and its answer is dropped
+        6. policy : backoff and circuit breaker of every request, None fetches once
+        7. rounds : times the failed items are retried at the end of the batch
+
+    return :
+        {item : result}, failed or timed out items map to None
+    """
+
+    bucket = TokenBucket(rate=rate, capacity=max_workers)
+    results = {}
+    queue = list(items)
+
+    for round in range(rounds + 1):
+        failed = fetch_round(fetch=fetch, items=queue, results=results, bucket=bucket,
+                             max_workers=max_workers, timeout=timeout, policy=policy)
+
+        if not failed:
+            break
+
+        queue = failed
+        if round < rounds:
+            print(f"retry {len(failed)} deferred items")
+            if policy:
+                policy.wait_for_host()
+
+    return results
+
+
+def fetch_round(fetch, items: list, results: dict, bucket: TokenBucket, max_workers: int, timeout: float, policy: FetchPolicy) -> list:
+    """
+    fetch items once on a thread pool, fill results and return the failed items
+    """
+
+    started = {}
+    failed = []
+    total = len(items)
+    # set when an item times out , its worker gives up before the next attempt
+    stops = {item: threading.Event() for item in items}
+
+    def task(item):
+        bucket.acquire()
+        started[item] = time.monotonic()
+        if policy:
+            return policy.call(fetch, item, stop=stops[item])
+        return fetch(item)
+
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    futures = {pool.submit(task, item): item for item in items}
+    pending = set(futures)
+
+    while pending:
+        done, pending = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            item = futures[future]
+            try:
+                results[item] = future.result()
+            except Exception as e:
+                print(f"{item} error ouccrs {e}")
+                results[item] = None
+                failed.append(item)
+
+        now = time.monotonic()
+        for future in list(pending):
+            item = futures[future]
+            if item in started and now - started[item] > timeout:
+                print(f"{item} timeout after {timeout} seconds")
+                stops[item].set()
+                results[item] = None
+                failed.append(item)
+                pending.discard(future)
+
+        done_count = total - len(pending)
+        if done:
+            print(f"fetch process ({done_count}/{total})")
+
+    # a timed out request still in flight finishes in its background thread , do not wait for it
+    pool.shutdown(wait=False, cancel_futures=True)
+
+    return failed
@@ -0,0 +1,177 @@
+"""
+File : fetch_policy.py
+exponential backoff with jitter, per host circuit breaker and end of batch retry queue
+"""
+
+import threading
+import time
+import random
+
+YAHOO = "yahoo"
+
+FAILURE_THRESHOLD = 5   # consecutive failures before a host circuit opens
+RESET_TIMEOUT = 60      # seconds an open circuit waits before it lets one request through
+RETRY_ROUNDS = 2        # times the deferred items of a batch are retried
+
+
+class CircuitOpenError(Exception):
+    """Raised when the circuit breaker of a host is open."""
+    pass
+
+
+class FetchCancelledError(Exception):
+    """Raised when the caller gave up on a request , e.g. after its timeout."""
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = FAILURE_THRESHOLD, reset_timeout: float = RESET_TIMEOUT) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probe_at = None
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.opened_at is None:
+                return True
+
+            now = time.monotonic()
+            if now - self.opened_at < self.reset_timeout:
+                return False
+
+            # half open, a single probe at a time until it succeeds ,
+            # a probe that never reports back frees its slot after reset_timeout
+            if self.probe_at is not None and now - self.probe_at < self.reset_timeout:
+                return False
+
+            self.probe_at = now
+            return True
+
+    def retry_after(self) -> float:
+        with self.lock:
+            if self.opened_at is None:
+                return 0
+            return max(0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def record_success(self) -> None:
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probe_at = None
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+            self.probe_at = None
+            if self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    print(f"circuit opened after {self.failures} failures")
+                self.opened_at = time.monotonic()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(host: str) -> CircuitBreaker:
+    with _breakers_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker()
+        return _breakers[host]
+
+
+class FetchPolicy:
+    """
+    retries : attempts per call
+    base_delay , max_delay : backoff of attempt n is min(max_delay, base_delay * 2**n), half of it jittered
+    jitter : False waits the whole backoff , for policies that wait for data to be published rather than for a busy host
+    retry_on : exceptions that are retried, anything else is raised at once
+    host : circuit breaker name, None disables the breaker
+    """
+
+    def __init__(self, retries: int = 3, base_delay: float = 2.0, max_delay: float = 60.0, retry_on: tuple = (Exception,), host: str = YAHOO, jitter: bool = True) -> None:
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_on = retry_on
+        self.host = host
+        self.jitter = jitter
+
+    def backoff(self, attempt: int) -> float:
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        if not self.jitter:
+            return delay
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def call(self, fetch, *args, stop: threading.Event = None, **kwargs):
+        """
+        stop : set by the caller to give up , checked before every attempt and during the backoff.
+               an attempt that already runs is not interrupted
+        """
+        breaker = get_breaker(self.host) if self.host else None
+
+        for attempt in range(self.retries):
+            if stop is not None and stop.is_set():
+                raise FetchCancelledError("request cancelled")
+
+            if breaker and not breaker.allow():
+                raise CircuitOpenError(f"{self.host} circuit is open")
+
+            try:
+                result = fetch(*args, **kwargs)
+            except self.retry_on as e:
+                if breaker:
+                    breaker.record_failure()
+                if attempt == self.retries - 1:
+                    raise
+
+                delay = self.backoff(attempt)
+                print(f"{e} , retry {attempt+1} in {delay:.1f} seconds")
+                if stop is not None:
+                    stop.wait(delay)
+                else:
+                    time.sleep(delay)
+            else:
+                if breaker:
+                    breaker.record_success()
+                return result
+
+    def wait_for_host(self) -> None:
+        if self.host:
+            delay = get_breaker(self.host).retry_after()
+            if delay:
+                print(f"{self.host} circuit is open , wait {delay:.1f} seconds")
+                time.sleep(delay)
+
+
+def fetch_with_retry_queue(fetch, items: list, policy: FetchPolicy, rounds: int = RETRY_ROUNDS) -> dict:
+    """
+    fetch every item once, failed items are deferred to the end of the batch and retried
+
+    return :
+        {item : result}, items that failed in every round are left out
+    """
+
+    results = {}
+    queue = list(items)
+
+    for round in range(rounds + 1):
+        failed = []
+        for item in queue:
+            try:
+                results[item] = policy.call(fetch, item)
+            except Exception as e:
+                print(f"{item} deferred : {e}")
+                failed.append(item)
+
+        if not failed:
+            break
+
+        queue = failed
+        if round < rounds:
+            print(f"retry {len(failed)} deferred items")
+            policy.wait_for_host()
+
+    return results
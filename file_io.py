@@ -1,12 +1,15 @@
 import os
 import json
 import pandas as pd
+from candle_store import CandleStore, save_candle_store, recover_candle_store
+from candle_archive import save_candle_archive, read_candle_archive
 ROOT = os.path.dirname(__file__)
 RS_REPORT = os.path.join(ROOT,"rs_report")
 HEAT_REPORT = os.path.join(RS_REPORT,"heat_rank.csv")
 NEW_REPORT = os.path.join(RS_REPORT,"new.csv")
 STOCK_INFO_JSON = os.path.join(ROOT,"stock_info.json")
 PRICE_INFO_JSON = os.path.join(ROOT,"candles.json")
+PRICE_STORE = os.path.join(ROOT,"candles_store")
 
 def read_from_json(json_file_path: str) -> None:
     """
@@ -77,3 +80,59 @@ def read_stock_info_json():
 
 def read_stock_price_json():
     return read_from_json(json_file_path=PRICE_INFO_JSON)
+
+
+def archive_path(store_path: str = PRICE_STORE) -> str:
+    """
+    compressed snapshot of the store , the file that gets copied (google drive) instead of the store folder
+    """
+    return store_path + ".icz"
+
+
+def has_stock_price_data(store_path: str = PRICE_STORE) -> bool:
+    recover_candle_store(store_path=store_path)
+    return os.path.exists(store_path) or os.path.exists(archive_path(store_path)) or os.path.exists(PRICE_INFO_JSON)
+
+
+def save_stock_price_store(data: dict, store_path: str = PRICE_STORE) -> None:
+    save_candle_store(all_candles=data, store_path=store_path)
+    save_stock_price_archive(data=data, store_path=store_path)
+
+
+def save_stock_price_archive(data: dict, store_path: str = PRICE_STORE) -> None:
+    save_candle_archive(all_candles=data, archive_path=archive_path(store_path))
+
+
+def read_stock_price_archive(tickers=None, store_path: str = PRICE_STORE) -> dict:
+    """
+    decode the compressed snapshot , prices come back float32 rounded
+    """
+    return read_candle_archive(archive_path=archive_path(store_path), tickers=tickers)
+
+
+def read_stock_price_store(store_path: str = PRICE_STORE) -> CandleStore:
+    """
+    open the memory mapped candle store , built once when missing :
+    from the compressed snapshot (a copied machine) , else from a legacy candles.json
+    """
+
+    recover_candle_store(store_path=store_path)
+    if not os.path.exists(store_path):
+        if os.path.exists(archive_path(store_path)):
+            all_candles = read_stock_price_archive(store_path=store_path)
+        else:
+            all_candles = read_stock_price_json()
+        save_candle_store(all_candles=all_candles, store_path=store_path)
+
+    return CandleStore(store_path=store_path)
+
+
+def load_candles(tickers=None, columns=None, window: int = None, store_path: str = PRICE_STORE) -> dict:
+    """
+    load only a ticker subset / column subset / trailing window of the candle store
+
+    return : 
+        {ticker : {column : np.ndarray}}, tickers missing in the store are left out
+    """
+
+    return read_stock_price_store(store_path=store_path).select(tickers=tickers, columns=columns, window=window)
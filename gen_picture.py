@@ -1,4 +1,4 @@
-import yfinance as yf
+from market_data import get_provider
 import mplfinance as mpf
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -10,7 +10,7 @@ import shutil
 
 def gen_pic(save_path,ticker):
     # Download historical data for a given ticker symbol
-    data = yf.download(ticker, period='5y', progress=False)
+    data = get_provider().download(ticker, period='5y', progress=False)
 
     # Filter data to show only the last 3 years
     end_date = data.index[-1]
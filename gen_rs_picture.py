@@ -1,17 +1,29 @@
-import yfinance as yf
+from market_data import get_provider
 import mplfinance as mpf
 import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib
-from file_io import read_from_json
+from file_io import read_stock_price_store
 from stock_rules import qualified_stocks
 import os
 import shutil
 import gc
 
-def gen_pic(save_path,ticker):
+def load_bars(ticker,candles=None):
+    if candles is not None and ticker in candles:
+        bars = candles[ticker]
+        data_filtered = pd.DataFrame(data={
+            "Close" : bars["closes"][-252:],
+            "High" : bars["highs"][-252:],
+            "Low" : bars["lows"][-252:],
+            "Open" : bars["opens"][-252:],
+            "Volume" : bars["volumes"][-252:],
+        })
+        data_filtered.index = pd.to_datetime(bars["timestamps"][-252:], unit='s')
+        return data_filtered
+
     # Download historical data for a given ticker symbol
-    data = yf.download(ticker, period= "max", auto_adjust=True)
+    data = get_provider().download(ticker, period= "max", auto_adjust=True)
     print(data)
 
     data_dict = {
@@ -25,7 +37,10 @@ def gen_pic(save_path,ticker):
 
     data_filtered = pd.DataFrame(data=data_dict)
     data_filtered.index = data['High'][ticker].index.tolist()[-252:]
-    
+    return data_filtered
+
+def gen_pic(save_path,ticker,candles=None):
+    data_filtered = load_bars(ticker=ticker,candles=candles)
 
     # Define the colors for each moving average line
     mav_colors = ['red', 'blue', 'green', 'orange', 'purple', 'brown']
@@ -51,7 +66,7 @@ def gen_pic(save_path,ticker):
 
     fig.clf()
     plt.close(fig)
-    del data, data_filtered, fig, ax, lines
+    del data_filtered, fig, ax, lines
     gc.collect()
 
 if __name__ == "__main__":
@@ -75,14 +90,14 @@ if __name__ == "__main__":
     total_count = len(stock)
     process = 0
 
-    candles = read_from_json("candles.json")
+    candles = read_stock_price_store()
 
     for idx,name in enumerate(stock):
 
         save_path = os.path.join(picture_path,name+".png")
 
         try:
-            gen_pic(save_path,ticker=name)
+            gen_pic(save_path,ticker=name,candles=candles)
         except Exception as e:
             raise(e)
 
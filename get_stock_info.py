@@ -7,15 +7,23 @@ from collections import namedtuple
 import re
 from ftplib import FTP
 from io import StringIO
-import yfinance as yf
-from file_io import save_to_json, read_from_json
+from bisect import bisect_left
+from datetime import datetime, timezone
+import os
+import math
+import zlib
+from market_data import get_provider
+from file_io import save_to_json, read_from_json, save_stock_price_store, load_candles, has_stock_price_data, PRICE_STORE
 import time
+import system_log
 from common_data_type import candles_info
+from fetch_engine import concurrent_fetch, MAX_WORKERS, REQUEST_RATE, REQUEST_TIMEOUT
+from fetch_policy import FetchPolicy, fetch_with_retry_queue
 
 UNKNOWN = "unknown"
 
 STOCK_INFO_JSON_PATH = "stock_info.json"
-STOCK_PRICE_JSON_FILE = "candles.json"
+STOCK_INFO_CACHE_PATH = "stock_info_cache.json"
 
 MARKET_CAP_1000E = 100_000_000_000
 MARKET_CAP_100E = 10_000_000_000
@@ -24,7 +32,22 @@ MARKET_CAP_10E  = 1_000_000_000
 
 SOCKET_DELAY = 0.2
 
-Ticket = namedtuple("Ticket", ["ticket", "sector", "industry", "marketCap",])
+# seconds a cached info field stays fresh
+# sector , industry and shares outstanding rarely change , they are fetched again after INFO_TTL.
+# marketCap is not fetched again , it follows the stored close (shares x close)
+INFO_TTL = 180 * 86400
+
+# stored bars fetched again by an incremental sync to detect splits and dividends
+OVERLAP_BARS = 5
+ADJUST_TOLERANCE = 1e-4
+
+DOWNLOAD_BATCH_SIZE = 100
+DOWNLOAD_THREADS = 8
+
+INFO_POLICY = FetchPolicy(retries=3, base_delay=2, max_delay=30)
+DOWNLOAD_POLICY = FetchPolicy(retries=3, base_delay=5, max_delay=60)
+
+Ticket = namedtuple("Ticket", ["ticket", "sector", "industry", "marketCap", "shares"], defaults=[None])
 
 @staticmethod
 def get_tickers_from_nasdaq() -> dict:
@@ -78,8 +101,10 @@ def get_tickers_from_nasdaq() -> dict:
 
     return tickers
 
-@staticmethod
-def search_ticker_info(name) -> Ticket:
+def fetch_ticker_info(name) -> Ticket:
+    """
+    one info request, errors are raised to the fetch policy
+    """
     
     def escape_ticker(ticker):
         return ticker.replace(".", "-")
@@ -96,35 +121,113 @@ def search_ticker_info(name) -> Ticket:
         return value
 
     escaped_ticker = escape_ticker(name)
-    from curl_cffi import requests
-    session = requests.Session(impersonate="chrome")
 
-    for i in range(3):
-        try:
-            info = yf.Ticker(escaped_ticker,session=session)
-
-            ticket = Ticket(
-                ticket=name,
-                sector=get_info_from_dict(info.info, "sector"),
-                industry=get_info_from_dict(info.info, "industry"),
-                marketCap=get_info_from_dict(info.info, "marketCap"),
-            )
-            break
-        except Exception as e:
-            print(f"{name} error ouccrs {e}")
-            print(f"retry {i+1} times")
-            time.sleep(60)
-    else:
-        print("there isn't any request after test 3 times")
-        return None
+    info = get_provider().ticker_info(escaped_ticker)
+
+    return Ticket(
+        ticket=name,
+        sector=get_info_from_dict(info, "sector"),
+        industry=get_info_from_dict(info, "industry"),
+        marketCap=get_info_from_dict(info, "marketCap"),
+        shares=info.get("sharesOutstanding"),
+    )
+
+def is_info_expired(name: str, entry: dict, now: float) -> bool:
+    # every ticker gets its own ttl between 50% and 100% of INFO_TTL,
+    # so a cold cache does not expire all at once
+    spread = 0.5 + 0.5 * (zlib.crc32(name.encode()) % 1000) / 1000
+    updated = entry.get("updated", 0)
+    # caches of the per field timestamps
+    if isinstance(updated, dict):
+        updated = min(updated.values(), default=0)
+
+    return now - updated > INFO_TTL * spread
+
+
+def current_market_cap(entry: dict, close) -> float:
+    """
+    shares outstanding x the last stored close , the fetched marketCap without shares or close
+    """
+    shares = entry.get("shares")
+    if isinstance(shares, (int, float)) and shares > 0 and close is not None and math.isfinite(close):
+        return shares * close
+    return entry["marketCap"]
+
+
+def last_stored_closes(names: list) -> dict:
+    if not has_stock_price_data(store_path=PRICE_STORE):
+        return {}
 
-    return ticket
+    candles = load_candles(tickers=names, columns=["closes"], window=1, store_path=PRICE_STORE)
+    return {name: float(columns["closes"][-1]) for name, columns in candles.items() if len(columns["closes"])}
 
 
-def get_total_stocks_basic_info(marketCap = MARKET_CAP_10E,reuse_data = False) -> dict:
+def refresh_stock_info_cache(names: list, max_workers = MAX_WORKERS, rate = REQUEST_RATE) -> dict:
+    """
+    diff names against stock_info_cache.json, only new symbols and expired entries are fetched,
+    symbols not in names any more are dropped from the cache.
+    the marketCap of cached entries is shares x the last stored close , no request
+
+    return : 
+        {name : Ticket}, None when a symbol has no cached info and the fetch failed
+    """
+
+    cache = read_from_json(STOCK_INFO_CACHE_PATH) if os.path.exists(STOCK_INFO_CACHE_PATH) else {}
+    now = time.time()
+
+    listed = set(names)
+    delisted = [name for name in cache if name not in listed]
+    for name in delisted:
+        del cache[name]
+
+    stale = [name for name in names if name not in cache or is_info_expired(name, cache[name], now)]
+
+    print(f"info cache : {len(stale)} new or expired , {len(delisted)} delisted , {len(names)-len(stale)} fresh")
+
+    infos = concurrent_fetch(
+        fetch=fetch_ticker_info,
+        items=stale,
+        max_workers=max_workers,
+        rate=rate,
+        timeout=REQUEST_TIMEOUT * 4,
+        policy=INFO_POLICY,
+    )
+
+    for name, ticket in infos.items():
+        if ticket is None:
+            continue
+
+        cache[name] = {
+            "sector": ticket.sector,
+            "industry": ticket.industry,
+            "marketCap": ticket.marketCap,
+            "shares": ticket.shares,
+            "updated": now,
+        }
+
+    save_to_json(data=cache, json_file_path=STOCK_INFO_CACHE_PATH)
+
+    closes = last_stored_closes(names=[name for name in names if name in cache])
+
+    return {
+        name : Ticket(
+            ticket=name,
+            sector=cache[name]["sector"],
+            industry=cache[name]["industry"],
+            marketCap=current_market_cap(cache[name], closes.get(name)),
+            shares=cache[name].get("shares"),
+        ) if name in cache else None
+        for name in names
+    }
+
+
+def get_total_stocks_basic_info(marketCap = MARKET_CAP_10E,reuse_data = False,max_workers = MAX_WORKERS,rate = REQUEST_RATE,incremental = False) -> dict:
     """
     input : 
         1. marketCap : Set minimum stock market capitalization limit.
+        2. max_workers : number of concurrent info requests
+        3. rate : max info requests per second
+        4. incremental : reuse stock_info_cache.json, only fetch new and expired symbols
 
     return : 
         stock info
@@ -138,19 +241,25 @@ def get_total_stocks_basic_info(marketCap = MARKET_CAP_10E,reuse_data = False) -
 
     tickets=get_tickers_from_nasdaq()
 
-    size = len(tickets)
-
     empty_skip_list = ["MOBBW","NUKKW"]
 
-    for idx, name in enumerate(tickets.keys()):
+    names = [name for name in tickets.keys() if name not in empty_skip_list]
 
-        print(f"process {name} info ({idx+1}/{size})")
+    if incremental:
+        infos = refresh_stock_info_cache(names=names, max_workers=max_workers, rate=rate)
+    else:
+        infos = concurrent_fetch(
+            fetch=fetch_ticker_info,
+            items=names,
+            max_workers=max_workers,
+            rate=rate,
+            timeout=REQUEST_TIMEOUT * 4,
+            policy=INFO_POLICY,
+        )
 
-        if name in empty_skip_list:
-            print(f"SKIP Stock [{name}]")
-            continue
+    for name in names:
 
-        ticket = search_ticker_info(name=name)
+        ticket = infos.get(name)
 
         if ticket is None:
             continue
@@ -166,8 +275,6 @@ def get_total_stocks_basic_info(marketCap = MARKET_CAP_10E,reuse_data = False) -
         ):
             empty_skip_list.append(name)
 
-        time.sleep(SOCKET_DELAY)
-
     for name in empty_skip_list:
         if name in tickets:
             del tickets[name]
@@ -176,6 +283,28 @@ def get_total_stocks_basic_info(marketCap = MARKET_CAP_10E,reuse_data = False) -
 
     return tickets
 
+def candles_from_frame(df, ticket_name: str, drop_empty: bool = False) -> candles_info:
+    """
+    split one ticker out of a yf.download frame
+    drop_empty : remove the dates this ticker has no bar (multi ticker frames share one index)
+    """
+    frame = df.xs(ticket_name, axis=1, level=1)
+
+    if drop_empty:
+        frame = frame.dropna(how="all")
+
+    timestamps = frame['High'].index.tolist()
+    timestamps = list(map(lambda timestamp: int(timestamp.timestamp()), timestamps))
+
+    return candles_info(
+        opens=frame['Open'].tolist(),
+        closes=frame['Close'].tolist(),
+        lows=frame['Low'].tolist(),
+        highs=frame['High'].tolist(),
+        volumes=frame['Volume'].tolist(),
+        timestamps=timestamps,
+    )
+
 @staticmethod
 def load_prices_from_yahoo(
     ticket_name: str,
@@ -183,61 +312,216 @@ def load_prices_from_yahoo(
     """
     load stocks price and save to json
     """
-    df = yf.download(ticket_name, period= "max", auto_adjust=True)
-    # yahoo_response = df.to_dict()
-    # print(yahoo_response)
+    df = get_provider().download(ticket_name, period= "max", auto_adjust=True)
 
-    # print(df['High']['AAPL'].tolist())
-    # print(df['High']['AAPL'].index.tolist()[0].timestamp())
+    return candles_from_frame(df=df, ticket_name=ticket_name)
 
-    timestamps = df['High'][ticket_name].index.tolist()
-    timestamps = list(map(lambda timestamp: int(timestamp.timestamp()), timestamps))
-    opens  = df['Open'][ticket_name].tolist()
-    closes = df['Close'][ticket_name].tolist()
-    lows = df['Low'][ticket_name].tolist()
-    highs = df['High'][ticket_name].tolist()
-    volumes = df['Volume'][ticket_name].tolist()
-
-
-    # timestamps = list(yahoo_response.keys())
-    # timestamps = list(map(lambda timestamp: int(timestamp.timestamp()), timestamps))
-    # opens = list(yahoo_response["Open"].values())
-    # closes = list(yahoo_response["Close"].values())
-    # lows = list(yahoo_response["Low"].values())
-    # highs = list(yahoo_response["High"].values())
-    # volumes = list(yahoo_response["Volume"].values())
-    return candles_info(
-        opens=opens,
-        closes=closes,
-        lows=lows,
-        highs=highs,
-        volumes=volumes,
-        timestamps=timestamps,
-    )
-    
 
-def get_stock_history_price_data(tickets_info: dict,reuse_data = False) -> dict:
+def load_prices_from_yahoo_batch(ticket_names: list, threads: int = DOWNLOAD_THREADS, start: str = None) -> dict:
+    """
+    load a group of stocks price with one yf.download call
+    start : "YYYY-MM-DD", only load bars from this day on (None loads the full history)
+
+    return : 
+        {ticket_name : candles_info}, tickers without any bar are left out
+    """
+    if start is None:
+        df = get_provider().download(ticket_names, period= "max", auto_adjust=True, threads=threads)
+    else:
+        df = get_provider().download(ticket_names, start=start, auto_adjust=True, threads=threads)
+
+    candles = {}
+    for name in ticket_names:
+        try:
+            candle = candles_from_frame(df=df, ticket_name=name, drop_empty=True)
+        except KeyError:
+            continue
+
+        if candle.timestamps:
+            candles[name] = candle
+
+    return candles
+
+
+def merge_candles(stored: dict, fresh: candles_info) -> dict:
+    """
+    replace the stored bars from the first fresh timestamp on with the fresh bars
+    """
+    if not fresh.timestamps:
+        return stored
+
+    keep = bisect_left(stored["timestamps"], fresh.timestamps[0])
+
+    return {
+        key : list(stored[key][:keep]) + list(getattr(fresh, key))
+        for key in candles_info._fields
+    }
+
+
+def has_history_changed(stored: dict, fresh: candles_info, tolerance: float = ADJUST_TOLERANCE) -> bool:
+    """
+    auto_adjust rescales the whole history after a split or dividend,
+    so the closes of the overlap window no longer match the stored ones.
+    the last stored bar is left out, it may have been a partial day
+    """
+    stored_closes = dict(zip(stored["timestamps"][-OVERLAP_BARS:-1], stored["closes"][-OVERLAP_BARS:-1]))
+
+    for timestamp, close in zip(fresh.timestamps, fresh.closes):
+        if timestamp not in stored_closes:
+            continue
+
+        stored_close = stored_closes[timestamp]
+        if math.isnan(stored_close) or math.isnan(close):
+            continue
+
+        if not math.isclose(stored_close, close, rel_tol=tolerance):
+            return True
+
+    return False
+
+
+def download_full_history(names: list, batch_size = DOWNLOAD_BATCH_SIZE, threads = DOWNLOAD_THREADS) -> dict:
+    '''
+    download the whole price history of names
+
+    batch_size : tickers per yf.download call, 1 downloads one by one
+    threads : download threads inside one yf.download call
+    '''
+
+    total_stocks = len(names)
+
+    all_candles = {}
+    failed = names
+
+    if batch_size > 1:
+        chunks = [tuple(names[start : start + batch_size]) for start in range(0, total_stocks, batch_size)]
+
+        def fetch_chunk(chunk):
+            print(f"load candles {chunk[0]}~{chunk[-1]} ({len(chunk)} tickers)")
+            candles = load_prices_from_yahoo_batch(ticket_names=list(chunk), threads=threads)
+            time.sleep(SOCKET_DELAY)
+            return candles
+
+        # yf.download keeps global state, so batches run one after another
+        results = fetch_with_retry_queue(fetch=fetch_chunk, items=chunks, policy=DOWNLOAD_POLICY)
+
+        failed = []
+        for chunk in chunks:
+            candles = results.get(chunk, {})
+            for name in chunk:
+                if name in candles:
+                    all_candles[name] = candles[name]._asdict()
+                else:
+                    failed.append(name)
+
+        print(f"retry {len(failed)} failed tickers")
+
+    def fetch_one(name):
+        print(f"load candles {name}")
+        candles = load_prices_from_yahoo(ticket_name=name)
+        time.sleep(SOCKET_DELAY)
+        return candles
+
+    results = fetch_with_retry_queue(fetch=fetch_one, items=failed, policy=DOWNLOAD_POLICY)
+
+    empty = candles_info(*[[] for _ in candles_info._fields])
+    for name in failed:
+        all_candles[name] = results.get(name, empty)._asdict()
+
+    return all_candles
+
+
+def sync_history(stored_candles: dict, names: list, batch_size = DOWNLOAD_BATCH_SIZE, threads = DOWNLOAD_THREADS) -> dict:
+    '''
+    only download the bars after the last stored timestamp of every name,
+    names whose overlap window shows a split or dividend get the full history again,
+    names missing in a batch answer are fetched again one by one
+    '''
+
+    def sync_start(chunk) -> str:
+        first_timestamp = min(stored_candles[name]["timestamps"][-OVERLAP_BARS:][0] for name in chunk)
+        return datetime.fromtimestamp(first_timestamp, tz=timezone.utc).strftime("%Y-%m-%d")
+
+    # tickers with a similar last bar share one download window
+    names = sorted(names, key=lambda name: stored_candles[name]["timestamps"][-1])
+    batch_size = max(1, batch_size)
+    chunks = [tuple(names[start : start + batch_size]) for start in range(0, len(names), batch_size)]
+
+    def fetch_chunk(chunk):
+        since = sync_start(chunk)
+        print(f"sync candles {chunk[0]}~{chunk[-1]} ({len(chunk)} tickers) since {since}")
+        candles = load_prices_from_yahoo_batch(ticket_names=list(chunk), threads=threads, start=since)
+        time.sleep(SOCKET_DELAY)
+        return candles
+
+    results = fetch_with_retry_queue(fetch=fetch_chunk, items=chunks, policy=DOWNLOAD_POLICY)
+
+    fresh = {}
+    for chunk in chunks:
+        fresh.update(results.get(chunk, {}))
+
+    missing = [name for name in names if name not in fresh]
+    print(f"retry {len(missing)} tickers missing in the batch answers")
+
+    def fetch_one(name):
+        since = sync_start((name,))
+        print(f"sync candles {name} since {since}")
+        candles = load_prices_from_yahoo_batch(ticket_names=[name], threads=1, start=since)
+        time.sleep(SOCKET_DELAY)
+        return candles.get(name)
+
+    for name, candles in fetch_with_retry_queue(fetch=fetch_one, items=missing, policy=DOWNLOAD_POLICY).items():
+        if candles is not None:
+            fresh[name] = candles
+
+    all_candles = {}
+    changed = []
+    for name in names:
+        if name not in fresh:
+            system_log.warning(f"sync {name} failed , keep its stored candles until {datetime.fromtimestamp(stored_candles[name]['timestamps'][-1], tz=timezone.utc).strftime('%Y-%m-%d')}")
+            all_candles[name] = stored_candles[name]
+        elif has_history_changed(stored=stored_candles[name], fresh=fresh[name]):
+            changed.append(name)
+        else:
+            all_candles[name] = merge_candles(stored=stored_candles[name], fresh=fresh[name])
+
+    print(f"{len(changed)} tickers with split or dividend , reload full history {changed}")
+    all_candles.update(download_full_history(names=changed, batch_size=batch_size, threads=threads))
+
+    return all_candles
+
+
+def get_stock_history_price_data(tickets_info: dict,reuse_data = False,batch_size = DOWNLOAD_BATCH_SIZE,threads = DOWNLOAD_THREADS,incremental = False) -> dict:
     '''
     download stock histroy price data (days)
+
+    batch_size : tickers per yf.download call, 1 downloads one by one
+    threads : download threads inside one yf.download call
+    incremental : only fetch the bars after the stored candles, new symbols get a full download
+
+    the candle store is the persisted history , candles are numpy arrays when read back from it
     '''
 
+    names = list(tickets_info.keys())
+
     if reuse_data:
-        return read_from_json(STOCK_PRICE_JSON_FILE)
+        return load_candles(tickers=names, store_path=PRICE_STORE)
 
-    total_stocks = len(tickets_info.keys())
+    stored_candles = {}
+    if incremental and has_stock_price_data(store_path=PRICE_STORE):
+        stored_candles = load_candles(tickers=names, store_path=PRICE_STORE)
 
-    all_candles = {}
+    known = [name for name in names if name in stored_candles and len(stored_candles[name]["timestamps"])]
+    new = [name for name in names if name not in known]
 
-    for idx, name in enumerate(tickets_info.keys()):
-        print(f"load candles ({idx+1}/{total_stocks})")
-        all_candles[name] = load_prices_from_yahoo(
-            ticket_name=name,
-        )._asdict()
-        
-        time.sleep(SOCKET_DELAY)
+    print(f"sync {len(known)} stored tickers , full load {len(new)} tickers")
+
+    all_candles = sync_history(stored_candles=stored_candles, names=known, batch_size=batch_size, threads=threads)
+    all_candles.update(download_full_history(names=new, batch_size=batch_size, threads=threads))
+
+    all_candles = {name : all_candles[name] for name in names}
 
-    file_path = "candles.json"
-    save_to_json(data=all_candles,json_file_path=file_path)
+    save_stock_price_store(data=all_candles, store_path=PRICE_STORE)
     return all_candles
 
 
@@ -256,16 +540,16 @@ def get_stock_option_data(ticket_name: str, type: str = "call") -> list:
     """
 
     try:
-        ticker = yf.Ticker(ticket_name)
-        expiration_dates = ticker.options
+        provider = get_provider()
+        expiration_dates = provider.options(ticket_name)
 
         option_data_frames = []
 
         for expiration_date in expiration_dates:
             if type == "call":
-                option_chain = ticker.option_chain(expiration_date).calls
+                option_chain = provider.option_chain(ticket_name, expiration_date).calls
             else:
-                option_chain = ticker.option_chain(expiration_date).puts
+                option_chain = provider.option_chain(ticket_name, expiration_date).puts
 
             option_data_frames.append(option_chain)
     except Exception:
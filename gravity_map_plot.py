@@ -1,7 +1,6 @@
 from pathlib import Path
 import pandas as pd
 import numpy as np
-import json
 import os
 import time
 import warnings
@@ -11,6 +10,7 @@ import cugraph
 import subprocess
 import shutil
 from datetime import datetime
+from file_io import load_candles, PRICE_STORE
 
 warnings.filterwarnings('ignore')
 
@@ -27,22 +27,21 @@ def setup_environment(dir_name="solar_system_test"):
     print(f"📁 Output directory verified/created: ./{dir_name}/")
     return dir_name
 
-def load_all_candles_data(json_path, keep_tickers):
+def load_all_candles_data(store_path, keep_tickers):
     """
     【白名單機制】只載入在 keep_tickers 集合內的股票 K 線資料，阻斷垃圾資料
     """
-    with open(json_path, 'r', encoding='utf-8') as f:
-        candles_data = json.load(f)
+    candles_data = load_candles(tickers=keep_tickers, columns=['timestamps', 'closes'], store_path=store_path)
         
     close_prices = {}
     
     # 只允許在白名單內的股票進入系統
-    target_tickers = [t for t in candles_data.keys() if t in keep_tickers]
+    target_tickers = list(candles_data.keys())
     print(f"   -> Loading {len(target_tickers)} core whitelisted stocks.")
     
     for ticker in target_tickers:
-        timestamps = candles_data[ticker].get('timestamps', [])
-        closes = candles_data[ticker].get('closes', [])
+        timestamps = candles_data[ticker]['timestamps']
+        closes = candles_data[ticker]['closes']
         if len(timestamps) > 0 and len(closes) > 0:
             idx = pd.to_datetime(timestamps, unit='s')
             close_prices[ticker] = pd.Series(closes, index=idx)
@@ -304,7 +303,7 @@ def plot_interactive_html(cpu_edges_df, result_df, output_path):
     print("✅ Search and Highlight feature injected successfully!")
 
 
-def analyze_convergence_gpu(rs_csv_path, candles_json_path, output_dir):
+def analyze_convergence_gpu(rs_csv_path, candles_store_path, output_dir):
     start_time = time.time()
     print("1. [CPU] Reading RS Data and Generating Whitelist...")
     
@@ -330,7 +329,7 @@ def analyze_convergence_gpu(rs_csv_path, candles_json_path, output_dir):
         ind_dict = dict(zip(valid_rs_df['name'], valid_rs_df['industry_name']))
         
     print("2. [CPU] Reading Raw Candle Data...")
-    pd_price_df = load_all_candles_data(candles_json_path, keep_tickers)
+    pd_price_df = load_all_candles_data(candles_store_path, keep_tickers)
     
     if pd_price_df.empty or pd_price_df.shape[1] < 2:
         print("❌ 錯誤：經過過濾後剩餘股票過少，無法計算相關性。請調低 RANK_THRESHOLD。")
@@ -444,9 +443,10 @@ def deploy_to_github(source_path, target_path):
 
 if __name__ == "__main__":
     json_file = Path("candles.json")
+    store_path = Path(PRICE_STORE)
 
-    if not json_file.exists():
-        print(f"❌ Error: Cannot find {json_file}")
+    if not store_path.exists() and not json_file.exists():
+        print(f"❌ Error: Cannot find {store_path} or {json_file}")
         exit(1)
 
     RS_REPORT_FOLDER = Path(__file__).parent / "rs_report"
@@ -461,7 +461,7 @@ if __name__ == "__main__":
 
     analyze_convergence_gpu(
         str(rs_csv),
-        str(json_file),
+        str(store_path),
         output_dir,
     )
 
@@ -1,4 +1,4 @@
-import requests
+from session_pool import http_get
 from bs4 import BeautifulSoup
 import pandas as pd
 from file_io import read_lastest_rs_report, read_lastest_rs_report_path, HEAT_REPORT , NEW_REPORT
@@ -16,7 +16,7 @@ def get_heat_ranks_and_news() -> tuple:
     news_list = {}
 
     # 发起HTTP请求
-    response = requests.get(url, headers=headers)
+    response = http_get(url, headers=headers)
 
     # 检查响应状态
     if response.status_code == 200:
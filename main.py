@@ -3,6 +3,8 @@ from datetime import datetime
 from get_stock_info import MARKET_CAP_10E
 
 from pathlib import Path
+import os
+import sys
 import shutil
 
 def restore():
@@ -20,12 +22,15 @@ def restore():
 
 if __name__ == "__main__":
 
-    restore()
+    # python main.py --resume : continue the last interrupted backtest instead of starting over
+    resume = "--resume" in sys.argv
+    if not resume:
+        restore()
 
     RANGE = 10
     START = datetime(year=2015, month=1, day=2,hour=8)
     END   = datetime(year=2025, month=11, day=14,hour=8)
 
     ath_model = Ath_model(start_date=START,end_date=END,gap_to_high_range=RANGE,marketCap=MARKET_CAP_10E,reuse_data=True)
-    ath_model.run()
+    ath_model.run(rolling=True, workers=os.cpu_count(), resume=resume)
 
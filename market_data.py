@@ -0,0 +1,154 @@
+"""
+File : market_data.py
+market data provider, every yfinance call goes through get_provider()
+
+ICARUS_MARKET_DATA : live (default) , record , replay
+ICARUS_REPLAY_DIR : folder of recorded responses
+ICARUS_REPLAY_LATENCY : seconds added to every replayed response
+ICARUS_REPLAY_JITTER : random seconds added on top of the latency
+"""
+
+import os
+import time
+import random
+import pickle
+import hashlib
+from collections import namedtuple
+import yfinance as yf
+from session_pool import get_yf_session
+
+ROOT = os.path.dirname(__file__)
+REPLAY_DIR = os.path.join(ROOT, "replay")
+
+option_chain_group = namedtuple("option_chain_group", ["calls", "puts"])
+
+
+class MarketDataProvider:
+    def download(self, tickers, **kwargs):
+        raise NotImplementedError('this function needs to override by instance')
+
+    def ticker_info(self, symbol: str, session=None) -> dict:
+        raise NotImplementedError('this function needs to override by instance')
+
+    def history(self, symbol: str, **kwargs):
+        raise NotImplementedError('this function needs to override by instance')
+
+    def options(self, symbol: str) -> tuple:
+        raise NotImplementedError('this function needs to override by instance')
+
+    def option_chain(self, symbol: str, expiration: str) -> option_chain_group:
+        raise NotImplementedError('this function needs to override by instance')
+
+
+class LiveProvider(MarketDataProvider):
+    """
+    yfinance, every request goes through the pooled session of the calling thread
+    """
+
+    def download(self, tickers, **kwargs):
+        return yf.download(tickers, session=get_yf_session(), **kwargs)
+
+    def ticker_info(self, symbol: str, session=None) -> dict:
+        return yf.Ticker(symbol, session=session or get_yf_session()).info
+
+    def history(self, symbol: str, **kwargs):
+        return yf.Ticker(symbol, session=get_yf_session()).history(**kwargs)
+
+    def options(self, symbol: str) -> tuple:
+        return tuple(yf.Ticker(symbol, session=get_yf_session()).options)
+
+    def option_chain(self, symbol: str, expiration: str) -> option_chain_group:
+        chain = yf.Ticker(symbol, session=get_yf_session()).option_chain(expiration)
+        return option_chain_group(calls=chain.calls, puts=chain.puts)
+
+
+class ReplayProvider(MarketDataProvider):
+    """
+    record : call the live provider and save every response (or exception) under replay_dir
+    replay : serve the saved responses, no network access
+    """
+
+    def __init__(self, replay_dir: str = REPLAY_DIR, record: bool = False, latency: float = 0.0, jitter: float = 0.0, live: MarketDataProvider = None) -> None:
+        self.replay_dir = replay_dir
+        self.record = record
+        self.latency = latency
+        self.jitter = jitter
+        self.live = live if live is not None else LiveProvider()
+
+        if not os.path.exists(self.replay_dir):
+            os.makedirs(self.replay_dir)
+
+    def response_path(self, method: str, args: tuple, kwargs: dict) -> str:
+        key = repr((method, args, sorted(kwargs.items())))
+        digest = hashlib.sha1(key.encode()).hexdigest()
+        return os.path.join(self.replay_dir, f"{method}_{digest}.pkl")
+
+    def call(self, method: str, *args, session=None, **kwargs):
+        path = self.response_path(method, args, kwargs)
+
+        if self.record:
+            if session is not None:
+                kwargs["session"] = session
+            try:
+                response = ("ok", getattr(self.live, method)(*args, **kwargs))
+            except Exception as e:
+                response = ("error", e)
+
+            with open(path, "wb") as file:
+                pickle.dump(response, file)
+        else:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"no recorded response for {method}{args}")
+
+            if self.latency or self.jitter:
+                time.sleep(self.latency + random.uniform(0, self.jitter))
+
+            with open(path, "rb") as file:
+                response = pickle.load(file)
+
+        status, value = response
+        if status == "error":
+            raise value
+        return value
+
+    def download(self, tickers, **kwargs):
+        return self.call("download", tickers, **kwargs)
+
+    def ticker_info(self, symbol: str, session=None) -> dict:
+        return self.call("ticker_info", symbol, session=session)
+
+    def history(self, symbol: str, **kwargs):
+        return self.call("history", symbol, **kwargs)
+
+    def options(self, symbol: str) -> tuple:
+        return self.call("options", symbol)
+
+    def option_chain(self, symbol: str, expiration: str) -> option_chain_group:
+        return self.call("option_chain", symbol, expiration)
+
+
+_provider = None
+
+def set_provider(provider: MarketDataProvider) -> None:
+    global _provider
+    _provider = provider
+
+def get_provider() -> MarketDataProvider:
+    global _provider
+
+    if _provider is None:
+        mode = os.environ.get("ICARUS_MARKET_DATA", "live")
+
+        if mode == "live":
+            _provider = LiveProvider()
+        elif mode in ("record", "replay"):
+            _provider = ReplayProvider(
+                replay_dir=os.environ.get("ICARUS_REPLAY_DIR", REPLAY_DIR),
+                record=(mode == "record"),
+                latency=float(os.environ.get("ICARUS_REPLAY_LATENCY", 0)),
+                jitter=float(os.environ.get("ICARUS_REPLAY_JITTER", 0)),
+            )
+        else:
+            raise ValueError(f"unknown ICARUS_MARKET_DATA mode {mode}")
+
+    return _provider
@@ -1,7 +1,7 @@
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-import yfinance as yf
+from benchmark_cache import benchmark_frame
 import statsmodels.api as sm
 
 # ---------------------------
@@ -36,11 +36,7 @@ if df.empty:
 # Step 3: fetch SPY from yfinance and merge
 start = df["start_date"].min() - pd.Timedelta(days=1)
 end = df["start_date"].max() + pd.Timedelta(days=FUTURE_DAYS + 1) # Fetch enough data for future return calc
-spy = yf.download("SPY", start=start, end=end, progress=False)
-
-# --- 修正新版本 yfinance 結構 ---
-if isinstance(spy.columns, pd.MultiIndex):
-    spy.columns = [col[0] if isinstance(col, tuple) else col for col in spy.columns]
+spy = benchmark_frame("SPY", start=start, end=end)
 
 spy = spy.reset_index().rename(columns={"Date": "start_date", "Close": "spy_close"})
 spy["spy_return"] = spy["spy_close"].pct_change()
@@ -1,4 +1,5 @@
-import yfinance as yf
+from market_data import get_provider
+from fetch_policy import FetchPolicy, fetch_with_retry_queue
 import pandas as pd
 from datetime import datetime, timedelta
 from .option_calculate import OptionInput, calculate_greeks, implied_volatility
@@ -10,6 +11,8 @@ class DataNotUpdatedError(Exception):
 
 OPTION_LIST = ["SPY", "^VIX"]
 
+OPTION_POLICY = FetchPolicy(retries=3, base_delay=2, max_delay=30)
+
 def exdays(cur_date: datetime, exp_date: str):
     year, mom, day = map(int, exp_date.split("-"))
     exp = datetime(year, mom, day) + timedelta(hours=16)
@@ -21,23 +24,30 @@ def fetch_option_snapshot(today: datetime) -> pd.DataFrame:
 
     for stock_name in OPTION_LIST:
         print(f"Fetching: {stock_name}")
-        ticker = yf.Ticker(stock_name)
-        options = ticker.options
+        provider = get_provider()
 
         try:
-            current_stock_price = ticker.history(period="1d")['Close'].iloc[0]
+            options = OPTION_POLICY.call(provider.options, stock_name)
+            current_stock_price = OPTION_POLICY.call(provider.history, stock_name, period="1d")['Close'].iloc[0]
         except Exception as e:
             print(f"⚠️ Failed to fetch current price for {stock_name}: {e}")
             continue
 
+        # failed expirations are retried once the whole chain list went through
+        chains = fetch_with_retry_queue(
+            fetch=lambda exp_date: provider.option_chain(stock_name, exp_date),
+            items=options,
+            policy=OPTION_POLICY,
+        )
+
         for exp_date in options:
 
-            try:
-                option_chain = ticker.option_chain(exp_date)
-            except Exception:
+            if exp_date not in chains:
                 print(f"⚠️ Failed to fetch chain for {exp_date}, skipping.")
                 continue
 
+            option_chain = chains[exp_date]
+
             for opt_type, chain in [("call", option_chain.calls), ("put", option_chain.puts)]:
                 for _, row in chain.iterrows():
                     k = row['strike']
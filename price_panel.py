@@ -0,0 +1,445 @@
+"""
+File : price_panel.py
+ticker x date price panel for cross sectional computation
+
+every ticker's bars are packed in one row per column , the master trading calendar (the union of all bars)
+maps a day to the bar of every ticker through the running count of its bars. a day of the whole market is
+one column and a report is a few column operations instead of a loop over tickers.
+
+windows are taken over every ticker's own bars like history_price_filter on slice_data , a ticker that
+misses market days reaches further back instead of seeing those days as holes.
+"""
+
+import os
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from data_analysis import WEEKLY_52_BAR, SEASON_BAR, get_week_start_and_end, save_rs_report, settle_moving_averages
+from common_data_type import history_price_group
+
+PANEL_COLUMNS = ["opens", "closes", "lows", "highs", "volumes"]
+MOVING_AVG_WEIGHTS = [5, 10, 20, 50, 100, 150, 200]
+
+
+def season_weight_table(weights: list) -> dict:
+    """
+    input :
+        weights : relative_strength weights of the 4 seasons , from the current season back
+
+    return :
+        {count of missing seasons : weights} , the weights of missing seasons go to the oldest season left
+    """
+
+    table = {}
+    for none_count in range(4):
+        kept = 4 - none_count
+        oldest = 0.0
+        for weight in reversed(weights[kept - 1:]):
+            oldest += weight
+        table[none_count] = list(weights[:kept - 1]) + [oldest]
+
+    return table
+
+
+# relative_strength weights by count of missing seasons , from the current season back
+SEASON_WEIGHTS = season_weight_table([0.6, 0.2, 0.1, 0.1])
+
+
+def relative_strengths(seasons: np.ndarray, weight_table: dict = SEASON_WEIGHTS) -> np.ndarray:
+    """
+    relative_strength of every row of a tickers x 4 seasons_change matrix , -1 without any season
+
+    the season range is taken over all rows, like gen_rs_report over the stocks that beat spy
+    """
+
+    # gen_rs_report skips missing and zero season changes for the season range
+    ranged = np.where(seasons == 0, np.nan, seasons)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        season_min = np.nanmin(ranged, axis=0) if len(seasons) else np.full(4, np.nan)
+        season_weight = np.abs(np.nanmax(ranged, axis=0) - season_min) if len(seasons) else np.full(4, np.nan)
+    season_min[np.isnan(season_min)] = 0
+    season_weight[np.isnan(season_weight) | (season_weight == 0)] = 1
+    normalized = (seasons - season_min) / season_weight
+
+    missing = np.isnan(seasons).sum(axis=1)
+    strength = np.full(len(seasons), -1.0)
+    for none_count, weights in weight_table.items():
+        selected = missing == none_count
+        # same summation order as relative_strength
+        total = normalized[selected, -1] * weights[0]
+        for back, weight in enumerate(weights[1:], start=2):
+            total = total + normalized[selected, -back] * weight
+        strength[selected] = total
+
+    return strength
+
+
+def round_values(values: np.ndarray) -> np.ndarray:
+    """
+    python round(value, 2) of every value , np.round rounds some halves the other way
+    """
+    return np.array([round(value, 2) for value in values.tolist()], dtype=np.float64)
+
+
+class PricePanel:
+    """
+    input :
+        1. all_data : {ticker : {column : array}} (candles.json layout or to_trading_day_index)
+        2. tickets_info : {ticker : info} , gives the row order and the industry of every ticker
+        3. since : first analysed day , every ticker keeps the WEEKLY_52_BAR - 1 bars before it
+
+    data[column] : tickers x bars matrix , every ticker's bars from the left , nan after its last bar
+    bar_timestamps : tickers x bars , timestamp of every bar
+    lengths : count of bars of every ticker
+    listed : tickers x dates , True where a ticker has a bar
+    bar_count : tickers x dates , count of bars of every ticker up to that day
+    industry_codes : row -> index into industries (industries in order of first appearance)
+    """
+
+    def __init__(self, all_data: dict, tickets_info: dict, since: datetime = None, columns: list = PANEL_COLUMNS) -> None:
+        self.tickers = [name for name in tickets_info if name in all_data]
+        self.rows = np.arange(len(self.tickers))
+
+        industry_names = [tickets_info[name]["industry"] for name in self.tickers]
+        self.industries = list(dict.fromkeys(industry_names))
+        codes = {industry: code for code, industry in enumerate(self.industries)}
+        self.industry_codes = np.array([codes[industry] for industry in industry_names], dtype=np.int64)
+
+        # the bars of every ticker the windows of the first day reach
+        firsts = []
+        stamps = []
+        for name in self.tickers:
+            timestamps = np.asarray(all_data[name]["timestamps"], dtype=np.int64)
+            first = 0 if since is None else max(0, int(np.searchsorted(timestamps, since.timestamp())) - WEEKLY_52_BAR + 1)
+            firsts.append(first)
+            stamps.append(timestamps[first:])
+
+        self.lengths = np.array([len(timestamps) for timestamps in stamps], dtype=np.int64)
+        self.timestamps = np.unique(np.concatenate(stamps)) if stamps else np.empty(0, dtype=np.int64)
+
+        width = int(self.lengths.max()) if len(self.lengths) else 0
+        self.data = {column: np.full((len(self.tickers), width), np.nan) for column in columns}
+        self.bar_timestamps = np.zeros((len(self.tickers), width), dtype=np.int64)
+        self.listed = np.zeros((len(self.tickers), len(self.timestamps)), dtype=bool)
+
+        for row, name in enumerate(self.tickers):
+            length = self.lengths[row]
+            self.bar_timestamps[row, :length] = stamps[row]
+            self.listed[row, np.searchsorted(self.timestamps, stamps[row])] = True
+            for column in columns:
+                self.data[column][row, :length] = np.asarray(all_data[name][column], dtype=np.float64)[firsts[row]:]
+
+        self.bar_count = np.cumsum(self.listed, axis=1, dtype=np.int32)
+
+    def day_position(self, day: datetime) -> int:
+        """
+        column of day in the calendar , -1 when no ticker has a bar that day
+        """
+        timestamp = day.timestamp()
+        position = int(np.searchsorted(self.timestamps, timestamp))
+        if position == len(self.timestamps) or self.timestamps[position] != timestamp:
+            return -1
+        return position
+
+    def last_bars(self, position: int) -> np.ndarray:
+        """
+        bar of every ticker on the calendar day at position (or its last bar before) , -1 before its first bar
+        """
+        if position < 0:
+            return np.full(len(self.tickers), -1, dtype=np.int64)
+        return self.bar_count[:, position].astype(np.int64) - 1
+
+    def window(self, column: str, position: int, width: int) -> np.ndarray:
+        """
+        tickers x width matrix of the last width bars of every ticker up to position , nan padded before its first bar
+        """
+        index = self.last_bars(position)[:, None] + np.arange(1 - width, 1)[None, :]
+        matrix = self.data[column][self.rows[:, None], np.maximum(index, 0)]
+        matrix[index < 0] = np.nan
+        return matrix
+
+    def moving_average(self, column: str, position: int, width: int) -> np.ndarray:
+        """
+        last moving average of every ticker , 0 when it has less than width bars or a nan bar (last_moving_average)
+        """
+        averages = self.window(column, position, width).mean(axis=1)
+        averages[np.isnan(averages)] = 0
+        return averages
+
+    def settle_moving_averages(self, column: str, position: int, last: np.ndarray, averages: dict) -> dict:
+        """
+        settle_moving_averages of moving_average results , over the last WEEKLY_52_BAR bars of every ticker
+        """
+        last_bar = self.last_bars(position)
+        return settle_moving_averages(last, averages, lambda row: self.data[column][row, max(last_bar[row] - WEEKLY_52_BAR + 1, 0) : last_bar[row] + 1])
+
+    def day_features(self, day: datetime) -> dict:
+        """
+        history_price_filter of every ticker for one day as columns
+
+        return :
+            {field : array over tickers} , valid marks the rows history_price_filter keeps ,
+            seasons_change is tickers x 4 with nan for a missing season
+        """
+
+        position = self.day_position(day)
+        count = len(self.tickers)
+        if position < 0:
+            return {"valid": np.zeros(count, dtype=bool)}
+
+        traded = self.listed[:, position]
+        last_bar = self.last_bars(position)
+        closes = self.window("closes", position, WEEKLY_52_BAR)
+        bars = np.minimum(last_bar + 1, WEEKLY_52_BAR)
+        listed = np.arange(WEEKLY_52_BAR)[None, :] >= (WEEKLY_52_BAR - bars)[:, None]
+        last_close = closes[:, -1]
+
+        # first occurrence of the extremes, the padding never wins
+        high_col = np.argmax(np.where(listed, closes, -np.inf), axis=1)
+        low_col = np.argmin(np.where(listed, closes, np.inf), axis=1)
+        rows = self.rows
+        weekly_52_high = closes[rows, high_col]
+        weekly_52_low = closes[rows, low_col]
+
+        monday, friday = get_week_start_and_end(start_date=day)
+        stamp_at = lambda col: self.bar_timestamps[rows, np.maximum(last_bar - WEEKLY_52_BAR + 1 + col, 0)]
+        break_high = (stamp_at(high_col) >= monday) & (stamp_at(high_col) <= friday)
+        break_low = (stamp_at(low_col) >= monday) & (stamp_at(low_col) <= friday)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            gap = round_values(((weekly_52_high - last_close) / weekly_52_high) * 100)
+
+            averages = self.settle_moving_averages("closes", position, last_close,
+                                                   {weight: self.moving_average("closes", position, weight) for weight in MOVING_AVG_WEIGHTS})
+            above_all = np.all([last_close >= averages[weight] for weight in MOVING_AVG_WEIGHTS], axis=0)
+            above_all &= (last_close > averages[20]) & (averages[20] > averages[50]) & (averages[50] > averages[200])
+
+            last_volume = self.data["volumes"][rows, np.maximum(last_bar, 0)]
+            volume_averages = self.settle_moving_averages("volumes", position, last_volume,
+                                                          {weight: self.moving_average("volumes", position, weight) for weight in [5, 20]})
+            big_volume = (last_volume > volume_averages[5]) & (last_volume > volume_averages[20])
+
+            # last bar up to last friday , it counts when it is in last week (last_friday_index)
+            week_position = int(np.searchsorted(self.timestamps, friday - 86400 * 7, side="right")) - 1
+            week_bar = self.last_bars(week_position)
+            has_week = (week_bar >= 0) & (self.bar_timestamps[rows, np.maximum(week_bar, 0)] >= monday - 86400 * 7)
+            last_week_close = self.data["closes"][rows, np.maximum(week_bar, 0)]
+            weekly_change = np.where(has_week, round_values(((last_close / last_week_close) - 1) * 100), 0)
+
+            first_close = closes[rows, np.argmax(listed, axis=1)]
+            yearly_base = np.where(first_close < weekly_52_low, first_close, weekly_52_low)
+            yearly_change = round_values(((last_close / yearly_base) - 1) * 100)
+
+            seasons = np.full((count, 4), np.nan)
+            for idx, season in enumerate(range(4, 0, -1)):
+                start = WEEKLY_52_BAR - SEASON_BAR * season
+                complete = bars >= SEASON_BAR * season
+                seasons[:, idx] = np.where(complete, round_values(((closes[:, start + SEASON_BAR - 1] / closes[:, start]) - 1) * 100), np.nan)
+
+            # open of one bar to the close of the next bar, from the 52 week low on (rolling_volatility)
+            opens = self.window("opens", position, WEEKLY_52_BAR)
+            change = (closes[:, 1:] - opens[:, :-1]) / opens[:, :-1]
+            inside = np.arange(WEEKLY_52_BAR - 1)[None, :] >= low_col[:, None]
+            changes = (WEEKLY_52_BAR - 1 - low_col).astype(np.float64)
+            mean = np.where(inside, change, 0).sum(axis=1) / changes
+            deviation = np.where(inside, change - mean[:, None], 0)
+            volatility = np.sqrt((deviation * deviation).sum(axis=1) / changes) * np.sqrt(WEEKLY_52_BAR) * 100
+        volatility[changes <= 0] = np.nan
+
+        valid = traded & (weekly_52_high != 0) & (weekly_52_low != 0) & ~(break_high & break_low)
+
+        return {
+            "valid": valid,
+            "weekly_52_high": weekly_52_high,
+            "weekly_52_low": weekly_52_low,
+            "gap_from_the_last_high": gap,
+            "break_high": break_high,
+            "break_low": break_low,
+            "break_high_today": high_col == WEEKLY_52_BAR - 1,
+            "break_low_today": low_col == WEEKLY_52_BAR - 1,
+            "big_volume": big_volume,
+            "above_all_moving_avg_line": above_all,
+            "last_close": last_close,
+            "moving_averages": averages,
+            "volatility": volatility,
+            "has_week": has_week,
+            "weekly_change": weekly_change,
+            "yearly_change": yearly_change,
+            "seasons_change": seasons,
+        }
+
+    def histories(self, day: datetime) -> dict:
+        """
+        cal_data of one day from the panel
+
+        return :
+            {ticket_name : history_price_group} of the valid tickers , in tickets_info order
+        """
+
+        features = self.day_features(day)
+        rows = np.flatnonzero(features["valid"])
+        if not len(rows):
+            return {}
+
+        values = {
+            field: features[field][rows].tolist()
+            for field in ["weekly_52_high", "weekly_52_low", "gap_from_the_last_high", "break_high", "break_low",
+                          "break_high_today", "break_low_today", "big_volume", "above_all_moving_avg_line",
+                          "has_week", "weekly_change", "yearly_change"]
+        }
+        volatility = ["{:.2f}".format(value) for value in features["volatility"][rows].tolist()]
+        seasons = [[None if np.isnan(value) else value for value in row] for row in features["seasons_change"][rows].tolist()]
+
+        histories = {}
+        for index, row in enumerate(rows.tolist()):
+            histories[self.tickers[row]] = history_price_group(
+                weekly_52_high=values["weekly_52_high"][index],
+                weekly_52_low=values["weekly_52_low"][index],
+                gap_from_the_last_high=values["gap_from_the_last_high"][index],
+                break_high=values["break_high"][index],
+                break_low=values["break_low"][index],
+                break_high_today=values["break_high_today"][index],
+                break_low_today=values["break_low_today"][index],
+                big_volume=values["big_volume"][index],
+                above_all_moving_avg_line=values["above_all_moving_avg_line"][index],
+                volatility=volatility[index],
+                # week_change returns 0 without a bar last week
+                weekly_change=values["weekly_change"][index] if values["has_week"][index] else 0,
+                yearly_change=values["yearly_change"][index],
+                seasons_change=seasons[index],
+            )
+
+        return histories
+
+    def industry_totals(self, features: dict, gap_range: float = 10) -> dict:
+        """
+        per industry sums of one day , arrays indexed by industry code
+        """
+
+        valid = features["valid"]
+        codes = self.industry_codes[valid]
+        size = len(self.industries)
+        count = lambda flags: np.bincount(codes, weights=flags[valid], minlength=size).astype(np.int64)
+
+        return {
+            "total_stocks": np.bincount(codes, minlength=size),
+            "ath_count": count(features["break_high_today"]),
+            "atl_count": count(features["break_low_today"]),
+            "approach_count": count(np.abs(features["gap_from_the_last_high"]) <= gap_range),
+            "week_change_sum": np.bincount(codes, weights=features["weekly_change"][valid], minlength=size),
+        }
+
+    def industry_frame(self, day: datetime, gap_range: float = 10) -> pd.DataFrame:
+        """
+        the report/ath_model_<day>.csv frame of cal_data , None when no ticker passes
+        """
+
+        features = self.day_features(day)
+        valid = features["valid"]
+        if not valid.any():
+            return None
+
+        totals = self.industry_totals(features, gap_range)
+        approach = np.abs(features["gap_from_the_last_high"]) <= gap_range
+
+        # industries show up in the order of their first valid ticker like cal_data
+        first_row = {}
+        for row in np.flatnonzero(valid).tolist():
+            first_row.setdefault(self.industry_codes[row], row)
+
+        rows = []
+        for code in first_row:
+            members = valid & (self.industry_codes == code)
+            names = lambda flags: " ,".join(self.tickers[row] for row in np.flatnonzero(members & flags).tolist())
+            total = int(totals["total_stocks"][code])
+            rows.append({
+                "industry_name": self.industries[code],
+                "break_high_group": names(features["break_high_today"]),
+                "break_low_group": names(features["break_low_today"]),
+                "approach_high": names(approach),
+                "ath_count": int(totals["ath_count"][code]),
+                "atl_count": int(totals["atl_count"][code]),
+                "approach_count": int(totals["approach_count"][code]),
+                "ath_ratio": str(round(int(totals["ath_count"][code]) / total, 2)),
+                "atl_ratio": str(round(int(totals["atl_count"][code]) / total, 2)),
+                "approach_ratio": str(round(int(totals["approach_count"][code]) / total, 2)),
+                "weekly_chagne": str(round(float(totals["week_change_sum"][code]) / total, 2)),
+                "total_stocks": total,
+            })
+
+        return pd.DataFrame(rows)
+
+    def market_counts(self, days: list) -> pd.DataFrame:
+        """
+        the datasheet.csv rows (start_date , ath_count , atl_count) of a range of days
+        """
+
+        rows = []
+        for day in days:
+            features = self.day_features(day)
+            valid = features["valid"]
+            if not valid.any():
+                continue
+
+            rows.append({
+                "start_date": day.strftime("%Y-%m-%d"),
+                "ath_count": int((valid & features["break_high_today"]).sum()),
+                "atl_count": int((valid & features["break_low_today"]).sum()),
+            })
+
+        return pd.DataFrame(rows, columns=["start_date", "ath_count", "atl_count"])
+
+    def rs_frame(self, day: datetime, spy_data, gap_range: float = 10) -> pd.DataFrame:
+        """
+        the unfiltered frame of gen_rs_report for one day , spy_data is cal_spy of that day
+        """
+
+        features = self.day_features(day)
+        valid = features["valid"]
+        totals = self.industry_totals(features, gap_range)
+
+        keep = valid & (features["yearly_change"] >= spy_data.yearly_change)
+        # gen_rs_report walks industry by industry in order of first appearance
+        order = np.flatnonzero(valid)
+        industry_rank = {}
+        for row in order.tolist():
+            industry_rank.setdefault(self.industry_codes[row], len(industry_rank))
+        rows = np.flatnonzero(keep)
+        rows = rows[np.argsort([industry_rank[code] for code in self.industry_codes[rows]], kind="stable")]
+
+        seasons = features["seasons_change"][rows]
+        strength = relative_strengths(seasons)
+
+        codes = self.industry_codes[rows]
+        return pd.DataFrame({
+            "name": [self.tickers[row] for row in rows.tolist()],
+            "yearly_change": np.abs(features["yearly_change"][rows] - spy_data.yearly_change),
+            "current_season_change": seasons[:, -1],
+            "volatility(%)": ["{:.2f}".format(value) for value in features["volatility"][rows]],
+            f"close_to_high_{gap_range}%": features["gap_from_the_last_high"][rows] < gap_range,
+            "powerful_than_spy": features["weekly_change"][rows] > spy_data.weekly_change,
+            "group_powerful_than_spy": totals["week_change_sum"][codes] > spy_data.weekly_change,
+            "breakout_with_big_volume": features["big_volume"][rows] & features["break_high_today"][rows],
+            "above_all_moving_avg_line": features["above_all_moving_avg_line"][rows],
+            "industry_name": [self.industries[code] for code in codes.tolist()],
+            "relative_strength": strength,
+        })
+
+
+def save_panel_reports(panel: PricePanel, day: datetime, spy_data, gap_range: float = 10) -> pd.DataFrame:
+    """
+    write report/ath_model_<day>.csv and rs_report/rs_model_<day>.csv from the panel
+
+    return :
+        the industry frame , None when no ticker has a bar that day
+    """
+
+    frame = panel.industry_frame(day, gap_range)
+    if frame is None:
+        return None
+
+    daystring = day.strftime("%Y-%m-%d")
+    frame.to_csv(os.path.join("report", "ath_model_" + daystring + ".csv"), index=False)
+    save_rs_report(ALLDF=panel.rs_frame(day, spy_data, gap_range), start_date=day)
+
+    return frame
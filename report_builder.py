@@ -0,0 +1,89 @@
+"""
+File : report_builder.py
+collect report rows as columns and build the DataFrame once,
+instead of one single row DataFrame per row joined with pd.concat ,
+or stream them to a csv one row at a time (CsvAppender)
+"""
+
+import os
+import csv
+import pandas as pd
+
+
+class ReportBuilder:
+    """
+    builder = ReportBuilder()
+    builder.append({"name" : ..., "rank" : ...})
+    builder.to_frame()
+
+    columns keep the order they first show up in, a row without a column leaves it empty
+    """
+
+    def __init__(self) -> None:
+        self.columns : dict = {}
+        self.rows = 0
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def append(self, row: dict) -> None:
+        for key in row:
+            if key not in self.columns:
+                self.columns[key] = [None] * self.rows
+
+        for key, values in self.columns.items():
+            values.append(row.get(key))
+
+        self.rows += 1
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.columns)
+
+
+class CsvAppender:
+    """
+    append report rows to a csv as soon as they are computed, a crash keeps every finished row
+
+    key : column that identifies a row (the day), rows whose key is already in the file are skipped
+    """
+
+    def __init__(self, path: str, key: str) -> None:
+        self.path = path
+        self.key = key
+        self.columns = None
+        self.seen = None
+
+    def load(self) -> None:
+        self.seen = set()
+
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return
+
+        with open(self.path, mode="r", newline="") as file:
+            reader = csv.reader(file)
+            self.columns = next(reader)
+            position = self.columns.index(self.key)
+            self.seen = {line[position] for line in reader if line}
+
+    def append(self, row: dict) -> bool:
+        """
+        return :
+            False when the key of row is already in the file
+        """
+
+        if self.seen is None:
+            self.load()
+
+        key = str(row[self.key])
+        if key in self.seen:
+            return False
+
+        with open(self.path, mode="a", newline="") as file:
+            writer = csv.writer(file, lineterminator="\n")
+            if self.columns is None:
+                self.columns = list(row)
+                writer.writerow(self.columns)
+            writer.writerow(["" if row.get(column) is None else row.get(column) for column in self.columns])
+
+        self.seen.add(key)
+        return True
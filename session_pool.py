@@ -0,0 +1,81 @@
+"""
+File : session_pool.py
+process wide http sessions with keep alive, every fetcher gets its client here
+
+ICARUS_POOL_SIZE : kept alive connections per host
+ICARUS_HOST_LIMIT : concurrent requests per host
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from fetch_engine import REQUEST_TIMEOUT
+
+POOL_SIZE = int(os.environ.get("ICARUS_POOL_SIZE", 16))
+HOST_LIMIT = int(os.environ.get("ICARUS_HOST_LIMIT", 8))
+
+_lock = threading.Lock()
+_local = threading.local()
+_http_session = None
+_host_slots = {}
+
+
+def get_http_session() -> requests.Session:
+    """
+    requests session shared by every thread, connections are kept alive per host
+    """
+    global _http_session
+
+    with _lock:
+        if _http_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _http_session = session
+
+    return _http_session
+
+
+def get_yf_session():
+    """
+    curl_cffi session impersonating chrome for yfinance,
+    one per thread because a curl handle must not be used by two threads at once
+    """
+    if not hasattr(_local, "yf_session"):
+        from curl_cffi import requests as curl_requests
+        _local.yf_session = curl_requests.Session(impersonate="chrome", timeout=REQUEST_TIMEOUT)
+
+    return _local.yf_session
+
+
+@contextmanager
+def host_slot(host: str):
+    """
+    limit the concurrent requests to one host
+    """
+    with _lock:
+        if host not in _host_slots:
+            _host_slots[host] = threading.BoundedSemaphore(HOST_LIMIT)
+        slot = _host_slots[host]
+
+    with slot:
+        yield
+
+
+def http_request(method: str, url: str, **kwargs) -> requests.Response:
+    kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+
+    with host_slot(urlparse(url).hostname):
+        return get_http_session().request(method, url, **kwargs)
+
+
+def http_get(url: str, **kwargs) -> requests.Response:
+    return http_request("GET", url, **kwargs)
+
+
+def http_post(url: str, **kwargs) -> requests.Response:
+    return http_request("POST", url, **kwargs)
@@ -0,0 +1,219 @@
+"""
+File : sweep.py
+parameter sweep of the Ath_model rules
+
+the expensive per ticker features (PricePanel.day_features) are computed once per day, every configuration
+of the grid is then a few vectorized passes over those arrays. a 100 point sweep costs about one run.
+
+rules :
+    qualified : stock_rules.qualified_stocks (close to the high , stronger than spy , breakout , rank)
+    powerful : stock_rules.powerful_than_spy_stock (stronger than spy , above_all_moving_avg_line)
+
+output :
+    sweep/config_<n>.csv : one row per day of configuration n
+    sweep/sweep_summary.csv : one row per configuration , its parameters and averages of its daily rows
+"""
+
+import os
+import re
+import itertools
+from collections import namedtuple
+from datetime import datetime
+import numpy as np
+from data_analysis import Ath_model , EXCLUDE_INDUSTRIES , trading_days , cal_spy
+from price_panel import PricePanel , MOVING_AVG_WEIGHTS , season_weight_table , relative_strengths
+from report_builder import ReportBuilder
+from get_stock_info import MARKET_CAP_10E
+
+SWEEP_DIR = "sweep"
+HORIZON_BARS = 20   # forward return of the picks over this many market days
+
+SweepConfig = namedtuple(
+    "SweepConfig",
+    [
+        "gap_range",            # close_to_high / approach_high distance to the 52 week high in %
+        "ma_weights",           # above_all_moving_avg_line of powerful : close >= every one of these moving averages
+        "ma_stack",             # ... and close > ma_stack[0] > ma_stack[1] > ...
+        "season_weights",       # relative_strength weights , from the current season back
+        "exclude_keywords",     # industries left out of the ranking
+        "min_rank",             # rank of stock_rules.qualified_stocks
+    ],
+    defaults=[10, tuple(MOVING_AVG_WEIGHTS), (20, 50, 200), (0.6, 0.2, 0.1, 0.1), EXCLUDE_INDUSTRIES, 90],
+)
+
+
+def sweep_grid(**choices) -> list:
+    """
+    sweep_grid(gap_range=[5, 10, 15], min_rank=[80, 90]) : every combination , other fields keep their default
+    """
+
+    names = list(choices)
+    return [SweepConfig(**dict(zip(names, values))) for values in itertools.product(*choices.values())]
+
+
+def forward_returns(panel: PricePanel, rows: np.ndarray, position: int, horizon: int) -> np.ndarray:
+    """
+    close to close change in % over the next horizon bars of every ticker , nan past its last bar
+    """
+
+    closes = panel.data["closes"]
+    bars = panel.last_bars(position)[rows]
+    ahead = bars + horizon
+    future = np.where(ahead < panel.lengths[rows], closes[rows, np.minimum(ahead, closes.shape[1] - 1)], np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (future / closes[rows, bars] - 1) * 100
+
+
+def mean_or_nan(values: np.ndarray) -> float:
+    values = values[~np.isnan(values)]
+    return float(values.mean()) if len(values) else np.nan
+
+
+class ParameterSweep:
+    """
+    sweep = ParameterSweep(model, configs)
+    sweep.run()
+
+    model : Ath_model , its tickers , candles and days are shared by every configuration
+    """
+
+    def __init__(self, model: Ath_model, configs: list, horizon: int = HORIZON_BARS) -> None:
+        self.model = model
+        self.configs = configs
+        self.horizon = horizon
+
+        self.panel = model.price_panel()
+
+        self.extra_ma_weights = sorted({
+            weight for config in configs for weight in config.ma_weights + config.ma_stack
+        } - set(MOVING_AVG_WEIGHTS))
+        self.weight_tables = [season_weight_table(list(config.season_weights)) for config in configs]
+        # industry code -> excluded , per configuration
+        self.excluded = [
+            np.array([bool(re.search(config.exclude_keywords, industry, re.IGNORECASE)) for industry in self.panel.industries], dtype=bool)
+            for config in configs
+        ]
+        self.reports = [ReportBuilder() for _ in configs]
+
+    def evaluate_day(self, day: datetime) -> None:
+        panel = self.panel
+        position = panel.day_position(day)
+        features = panel.day_features(day)
+        valid = features["valid"]
+        if not valid.any():
+            return
+
+        spy_data = cal_spy(start_date=day, reuse_data=self.model.reuse_data)
+        totals = panel.industry_totals(features)
+
+        last_close = features["last_close"]
+        averages = dict(features["moving_averages"])
+        for weight in self.extra_ma_weights:
+            averages[weight] = panel.moving_average("closes", position, weight)
+        if self.extra_ma_weights:
+            averages = panel.settle_moving_averages("closes", position, last_close,
+                                                    {weight: average.copy() for weight, average in averages.items()})
+
+        # everything that does not depend on the rule parameters is computed once for the day
+        candidates = np.flatnonzero(valid & (features["yearly_change"] >= spy_data.yearly_change))
+        seasons = features["seasons_change"][candidates]
+        codes = panel.industry_codes[candidates]
+        gap = features["gap_from_the_last_high"]
+        stronger = (features["weekly_change"][candidates] > spy_data.weekly_change) & \
+            (totals["week_change_sum"][codes] > spy_data.weekly_change)
+        trend = stronger & (features["big_volume"] & features["break_high_today"])[candidates]
+        returns = forward_returns(panel, candidates, position, self.horizon)
+
+        for config, weight_table, excluded, report in zip(self.configs, self.weight_tables, self.excluded, self.reports):
+            with np.errstate(invalid="ignore"):
+                above_all = np.all([last_close >= averages[weight] for weight in config.ma_weights], axis=0)
+                stack = [last_close] + [averages[weight] for weight in config.ma_stack]
+                for upper, lower in zip(stack, stack[1:]):
+                    above_all &= upper > lower
+
+            strength = relative_strengths(seasons, weight_table)
+            ranked = np.flatnonzero((strength != -1) & ~excluded[codes])
+            ranked = ranked[np.argsort(-strength[ranked], kind="stable")]
+
+            # rank of save_rs_report , 100 for the strongest down to 0
+            rank = np.full(len(candidates), -1.0)
+            if len(ranked) > 1:
+                rank[ranked] = 100 - 100 / (len(ranked) - 1) * np.arange(len(ranked))
+                rank[ranked[-1]] = 0
+            elif len(ranked) == 1:
+                rank[ranked] = 100.0
+
+            leaders = rank >= config.min_rank
+            qualified = leaders & trend & (gap[candidates] < config.gap_range)
+            rows = np.flatnonzero(qualified)
+            # powerful_than_spy_stock reads every row of the rs report , the ranked candidates
+            powerful = np.zeros(len(candidates), dtype=bool)
+            powerful[ranked] = True
+            powerful &= stronger & above_all[candidates]
+
+            report.append({
+                "start_date": day.strftime("%Y-%m-%d"),
+                "ath_count": int((valid & features["break_high_today"]).sum()),
+                "approach_count": int((valid & (np.abs(gap) <= config.gap_range)).sum()),
+                "above_all_count": int((valid & above_all).sum()),
+                "ranked": len(ranked),
+                "leaders": int(leaders.sum()),
+                "qualified": len(rows),
+                "qualified_above_all": int(above_all[candidates][rows].sum()),
+                "qualified_names": " ,".join(panel.tickers[row] for row in candidates[rows].tolist()),
+                "powerful": int(powerful.sum()),
+                "powerful_names": " ,".join(panel.tickers[row] for row in candidates[powerful].tolist()),
+                f"leaders_return_{self.horizon}": round(mean_or_nan(returns[leaders]), 2),
+                f"qualified_return_{self.horizon}": round(mean_or_nan(returns[rows]), 2),
+                f"powerful_return_{self.horizon}": round(mean_or_nan(returns[powerful]), 2),
+            })
+
+    def summary(self) -> ReportBuilder:
+        summary = ReportBuilder()
+        for index, (config, report) in enumerate(zip(self.configs, self.reports)):
+            frame = report.to_frame()
+            row = {"config": f"config_{index}", **config._asdict()}
+            row["ma_weights"] = " ".join(str(weight) for weight in config.ma_weights)
+            row["ma_stack"] = " ".join(str(weight) for weight in config.ma_stack)
+            row["season_weights"] = " ".join(str(weight) for weight in config.season_weights)
+            row["days"] = len(frame)
+
+            for column in ["approach_count", "above_all_count", "leaders", "qualified", "powerful"]:
+                row[f"avg_{column}"] = round(frame[column].mean(), 2) if len(frame) else np.nan
+
+            # days without a pick or without the forward bars are left out
+            for column in [f"leaders_return_{self.horizon}", f"qualified_return_{self.horizon}", f"powerful_return_{self.horizon}"]:
+                values = frame[column].dropna() if len(frame) else []
+                row[f"avg_{column}"] = round(values.mean(), 2) if len(values) else np.nan
+                row[f"win_rate_{column}"] = round((values > 0).mean(), 2) if len(values) else np.nan
+
+            summary.append(row)
+
+        return summary
+
+    def run(self) -> None:
+        for day in trading_days(self.model.start_date, self.model.end_date):
+            self.evaluate_day(day)
+
+        if not os.path.exists(SWEEP_DIR):
+            os.makedirs(SWEEP_DIR)
+
+        for index, report in enumerate(self.reports):
+            report.to_frame().to_csv(os.path.join(SWEEP_DIR, f"config_{index}.csv"), index=False)
+        self.summary().to_frame().to_csv(os.path.join(SWEEP_DIR, "sweep_summary.csv"), index=False)
+
+
+if __name__ == "__main__":
+
+    START = datetime(year=2015, month=1, day=2,hour=8)
+    END   = datetime(year=2025, month=11, day=14,hour=8)
+
+    ath_model = Ath_model(start_date=START,end_date=END,marketCap=MARKET_CAP_10E,reuse_data=True)
+
+    configs = sweep_grid(
+        gap_range=[5, 10, 15, 20],
+        ma_stack=[(20, 50, 200), (50, 150, 200)],
+        season_weights=[(0.6, 0.2, 0.1, 0.1), (0.4, 0.2, 0.2, 0.2), (0.25, 0.25, 0.25, 0.25)],
+        min_rank=[80, 90],
+    )
+    ParameterSweep(model=ath_model, configs=configs).run()
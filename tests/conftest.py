@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# the simulated days are utc midnight at hour=8 , like main.py on a utc+8 box
+os.environ["TZ"] = "Asia/Taipei"
+time.tzset()
+
+import benchmark_cache
+import data_analysis
+
+INDUSTRIES = ["Tech", "Retail", "Energy", "Software", "Chips"]
+
+
+def make_candles(tickers: int = 40, start: str = "2010-01-01", end: str = "2013-12-31", missing: float = 0.0, seed: int = 1) -> dict:
+    """
+    random walk candles in the candles.json layout , missing drops that share of every ticker's bars
+    """
+
+    rng = np.random.default_rng(seed)
+    calendar = np.array([int(day.timestamp()) for day in pd.bdate_range(start, end)], dtype=np.int64)
+
+    all_candles = {}
+    for index in range(tickers):
+        first = int(rng.integers(0, len(calendar) // 2)) if index % 3 else 0
+        keep = np.arange(first, len(calendar))
+        if missing:
+            keep = keep[rng.random(len(keep)) >= missing]
+
+        closes = np.round(20 * np.exp(np.cumsum(rng.normal(0, 0.02, len(keep)))), 2)
+        opens = np.round(closes * (1 + rng.normal(0, 0.005, len(keep))), 2)
+        all_candles[f"T{index:02d}"] = {
+            "opens": opens.tolist(),
+            "closes": closes.tolist(),
+            "lows": (np.minimum(opens, closes) * 0.99).tolist(),
+            "highs": (np.maximum(opens, closes) * 1.01).tolist(),
+            "volumes": rng.integers(100000, 1000000, len(keep)).astype(float).tolist(),
+            "timestamps": calendar[keep].tolist(),
+        }
+
+    return all_candles
+
+
+def make_model(all_candles: dict, start_date, end_date) -> data_analysis.Ath_model:
+    """
+    Ath_model over all_candles without any download , the first ticker is SPY
+    """
+
+    arrays = {name: data_analysis.to_trading_day_index(candles) for name, candles in all_candles.items()}
+    spy = next(iter(arrays))
+    benchmark_cache._series["SPY"] = arrays.pop(spy)
+
+    model = data_analysis.Ath_model.__new__(data_analysis.Ath_model)
+    model.stocks_info = {name: {"industry": INDUSTRIES[int(name[1:]) % len(INDUSTRIES)]} for name in arrays}
+    model.stocks_price_data = arrays
+    model.start_date = start_date
+    model.end_date = end_date
+    model.range = 10
+    model.marketCap = 0
+    model.reuse_data = True
+    model.panel = None
+    return model
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """
+    the report folders of Ath_model.run in an empty directory
+    """
+    for folder in ["report", "rs_report", "classic"]:
+        (tmp_path / folder).mkdir()
+    monkeypatch.chdir(tmp_path)
+    yield tmp_path
+    benchmark_cache._series.clear()
@@ -0,0 +1,46 @@
+from datetime import datetime
+
+import backtest_engine
+from conftest import make_candles, make_model
+
+
+def no_benchmark(*args, **kwargs):
+    raise AssertionError("no benchmark is needed without days")
+
+
+def test_resume_after_finished_run(workdir, monkeypatch):
+    model = make_model(make_candles(tickers=12), datetime(2012, 3, 1, 8), datetime(2012, 3, 9, 8))
+    model.run(rolling=True)
+    datasheet = (workdir / "datasheet.csv").read_text()
+    assert len(datasheet.splitlines()) == 8
+
+    monkeypatch.setattr(backtest_engine, "get_benchmark", no_benchmark)
+    model.run(rolling=True, workers=3, resume=True)
+
+    assert (workdir / "datasheet.csv").read_text() == datasheet
+
+
+def test_start_after_end(workdir, monkeypatch):
+    model = make_model(make_candles(tickers=12), datetime(2012, 3, 9, 8), datetime(2012, 3, 1, 8))
+
+    monkeypatch.setattr(backtest_engine, "get_benchmark", no_benchmark)
+    model.run(rolling=True, workers=3)
+
+    assert not (workdir / "datasheet.csv").exists()
+
+
+def test_volatility_after_a_bad_bar():
+    from data_analysis import to_trading_day_index, trading_days, get_week_start_and_end, slice_data, history_price_filter
+
+    candles = make_candles(tickers=1)["T00"]
+    candles["opens"][20] = float("nan")
+    candles["opens"][40] = 0.0
+    candles = to_trading_day_index(candles)
+
+    days = trading_days(datetime(2012, 1, 2, 8), datetime(2012, 6, 29, 8))
+    histories = backtest_engine.ticker_history(candles, [day.timestamp() for day in days], [get_week_start_and_end(day) for day in days])
+
+    assert histories
+    for position, history in histories.items():
+        expected = history_price_filter(slice_data(days[position], candles))
+        assert history.volatility == expected.volatility != "nan"
@@ -0,0 +1,19 @@
+import benchmark_cache
+from common_data_type import candles_info
+from conftest import make_candles
+from file_io import save_to_json
+
+
+def test_saved_series_ending_before_the_range_is_downloaded_again(workdir, monkeypatch):
+    latest = make_candles(tickers=1)["T00"]
+    cut = latest["timestamps"].index(benchmark_cache.to_timestamp("2012-12-31"))
+    saved = {column: values[: cut + 1] for column, values in latest.items()}
+
+    monkeypatch.setattr(benchmark_cache, "BENCHMARK_DIR", str(workdir / "benchmark"))
+    (workdir / "benchmark").mkdir()
+    save_to_json(data=saved, json_file_path=benchmark_cache.benchmark_path("SPY"))
+    monkeypatch.setattr(benchmark_cache, "load_prices_from_yahoo", lambda symbol: candles_info(**latest))
+
+    frame = benchmark_cache.benchmark_frame("SPY", start="2012-06-01", end="2013-06-01")
+
+    assert frame.index[-1].strftime("%Y-%m-%d") == "2013-05-31"
@@ -0,0 +1,40 @@
+from datetime import datetime
+
+from candle_validation import validate_candles
+from conftest import make_candles
+
+
+def quarantined(all_candles, **window) -> set:
+    report = validate_candles(all_candles, **window)
+    return set(report.loc[report["quarantined"], "ticker"])
+
+
+def backtest_window(first_day, last_day) -> dict:
+    return {"since": datetime(*first_day, 8).timestamp(), "until": datetime(*last_day, 8).timestamp(), "lookback_bars": 251}
+
+
+def test_bad_bar_outside_the_window():
+    all_candles = make_candles(tickers=3, start="2009-01-01")
+    all_candles["T00"]["volumes"][10] = float("nan")
+    all_candles["T00"]["closes"][20] = -1.0
+
+    assert "T00" not in quarantined(all_candles, **backtest_window((2012, 1, 2), (2012, 12, 31)))
+    assert "T00" in quarantined(all_candles, **backtest_window((2009, 3, 2), (2009, 12, 31)))
+
+
+def test_bad_bar_inside_the_window():
+    all_candles = make_candles(tickers=3, start="2009-01-01")
+    # the 52 week window of the first day
+    position = all_candles["T00"]["timestamps"].index(int(datetime(2011, 6, 1, 8).timestamp()))
+    all_candles["T00"]["opens"][position] = float("nan")
+
+    assert "T00" in quarantined(all_candles, **backtest_window((2012, 1, 2), (2012, 12, 31)))
+
+
+def test_delisted_ticker_is_not_stale_before_it_stops():
+    all_candles = make_candles(tickers=3, start="2009-01-01")
+    for column, values in all_candles["T00"].items():
+        all_candles["T00"][column] = values[:-300]
+
+    assert "T00" not in quarantined(all_candles, **backtest_window((2011, 1, 3), (2012, 6, 29)))
+    assert "T00" in quarantined(all_candles)
@@ -0,0 +1,70 @@
+from datetime import datetime
+
+import backtest_engine
+import data_analysis
+import feature_store
+from conftest import make_candles, make_model
+from file_io import read_from_json, save_to_json
+from price_panel import PricePanel
+
+
+def record_days(model, monkeypatch) -> list:
+    evaluated = []
+
+    def evaluate(days, rolling=False, ticker_workers=1, panel=False):
+        evaluated.extend(day.strftime("%Y-%m-%d") for day in days)
+        return iter([])
+
+    monkeypatch.setattr(model, "evaluate", evaluate)
+    return evaluated
+
+
+def test_resume_ignores_the_datasheet_of_another_backtest(workdir, monkeypatch):
+    model = make_model(make_candles(tickers=12), datetime(2012, 3, 1, 8), datetime(2012, 3, 9, 8))
+    (workdir / data_analysis.DATASHEET_CSV).write_text("start_date,ath_count,atl_count\n2012-03-05,1,0\n2012-03-06,1,0\n")
+    save_to_json(data={"key": {**model.checkpoint_key(), "marketCap": 1}, "last_day": "2012-03-02", "finished_days": 2},
+                 json_file_path=data_analysis.CHECKPOINT_JSON)
+
+    evaluated = record_days(model, monkeypatch)
+    model.run(resume=True)
+
+    assert evaluated == [day.strftime("%Y-%m-%d") for day in data_analysis.trading_days(model.start_date, model.end_date)]
+
+
+def test_resume_counts_the_days_of_this_backtest(workdir, monkeypatch):
+    model = make_model(make_candles(tickers=12), datetime(2012, 3, 1, 8), datetime(2012, 3, 9, 8))
+    # rows of older backtests and a day finished after the checkpoint
+    (workdir / data_analysis.DATASHEET_CSV).write_text(
+        "start_date,ath_count,atl_count\n2011-01-03,1,0\n2011-01-04,1,0\n2011-01-05,1,0\n2012-03-05,1,0\n")
+    save_to_json(data={"key": model.checkpoint_key(), "last_day": "2012-03-02", "finished_days": 2},
+                 json_file_path=data_analysis.CHECKPOINT_JSON)
+
+    evaluated = record_days(model, monkeypatch)
+    model.run(resume=True)
+
+    assert evaluated == ["2012-03-06", "2012-03-07", "2012-03-08", "2012-03-09"]
+    assert read_from_json(data_analysis.CHECKPOINT_JSON)["finished_days"] == 3
+
+
+def test_moving_average_ties_break_like_the_pandas_rolling_mean():
+    # ma20 and ma50 of T21 are equal on paper that day , np.mean and the rolling sum round them an ulp apart
+    model = make_model(make_candles(tickers=40, seed=2), datetime(2013, 6, 4, 8), datetime(2013, 6, 4, 8))
+    day = model.start_date
+    candles = model.stocks_price_data["T21"]
+    sliced = data_analysis.slice_data(start_date=day, ticket_candles=candles)
+
+    bars_close = sliced.closes[-data_analysis.WEEKLY_52_BAR:]
+    averages = {weight: data_analysis.calculate_moving_average(bars_close, weight)[-1] for weight in [5, 10, 20, 50, 100, 150, 200]}
+    expected = all(bars_close[-1] >= average for average in averages.values()) and \
+        bars_close[-1] > averages[20] > averages[50] > averages[200]
+
+    assert data_analysis.history_price_filter(candles=sliced).above_all_moving_avg_line == expected
+
+    weeks = [data_analysis.get_week_start_and_end(start_date=day)]
+    assert backtest_engine.ticker_history(candles, [int(day.timestamp())], weeks)[0].above_all_moving_avg_line == expected
+
+    panel = PricePanel(all_data=model.stocks_price_data, tickets_info=model.stocks_info, since=day)
+    assert panel.histories(day)["T21"].above_all_moving_avg_line == expected
+
+    features = feature_store.ticker_features(candles, len(sliced.closes) - 1)
+    assert features["above_all_moving_avg_line"][0] == expected
@@ -0,0 +1,14 @@
+import numpy as np
+
+from conftest import make_candles
+from feature_store import ticker_features
+
+
+def test_turnover_of_a_young_listing_uses_the_bars_it_has():
+    candles = {column: values[:20] for column, values in make_candles(tickers=1)["T00"].items()}
+
+    features = ticker_features(candles, first=0)
+
+    turnover = np.array(candles["closes"]) * np.array(candles["volumes"])
+    assert np.isclose(features["avg_turnover_30"][-1], turnover.mean())
+    assert np.isclose(features["avg_turnover_30"][4], turnover[:5].mean())
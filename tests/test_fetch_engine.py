@@ -0,0 +1,19 @@
+import time
+
+from fetch_engine import concurrent_fetch
+from fetch_policy import FetchPolicy
+
+
+def test_timed_out_item_stops_retrying():
+    calls = []
+
+    def fetch(item):
+        calls.append(item)
+        raise ConnectionError("host down")
+
+    policy = FetchPolicy(retries=5, base_delay=2, max_delay=2, host=None, jitter=False)
+    results = concurrent_fetch(fetch, ["A"], max_workers=1, rate=100, timeout=0.2, policy=policy, rounds=0)
+    time.sleep(0.5)
+
+    assert results == {"A": None}
+    assert calls == ["A"]
@@ -0,0 +1,53 @@
+import os
+import shutil
+
+import numpy as np
+
+import file_io
+from conftest import make_candles
+
+
+def test_store_is_rebuilt_from_the_archive(tmp_path):
+    candles = make_candles(tickers=5)
+    store_path = str(tmp_path / "candles_store")
+    file_io.save_stock_price_store(data=candles, store_path=store_path)
+
+    archive = file_io.archive_path(store_path)
+    stored = sum(os.path.getsize(os.path.join(store_path, name)) for name in os.listdir(store_path))
+    assert os.path.getsize(archive) < stored / 2
+
+    # a copied machine only has the archive
+    shutil.rmtree(store_path)
+    store = file_io.read_stock_price_store(store_path=store_path)
+
+    assert list(store) == list(candles)
+    for name, columns in candles.items():
+        assert np.array_equal(store[name]["timestamps"], columns["timestamps"])
+        assert np.array_equal(store[name]["volumes"], columns["volumes"])
+        for column in ["opens", "closes", "lows", "highs"]:
+            assert np.allclose(store[name][column], columns[column], rtol=1e-6)
+
+
+def test_store_survives_a_crash_between_the_renames(tmp_path, monkeypatch):
+    store_path = str(tmp_path / "candles_store")
+    candles = make_candles(tickers=3)
+    file_io.save_stock_price_store(data=candles, store_path=store_path)
+
+    # the new store never reaches its place
+    rename = os.rename
+    def crash(source, target):
+        if source.endswith(".tmp"):
+            raise OSError("crash")
+        rename(source, target)
+
+    monkeypatch.setattr(os, "rename", crash)
+    try:
+        file_io.save_stock_price_store(data=make_candles(tickers=5), store_path=store_path)
+    except OSError:
+        pass
+    monkeypatch.setattr(os, "rename", rename)
+
+    # the float64 store itself , not a rebuild from the float32 archive
+    store = file_io.read_stock_price_store(store_path=store_path)
+    assert list(store) == list(candles)
+    assert np.array_equal(store["T01"]["closes"], candles["T01"]["closes"])
@@ -0,0 +1,92 @@
+from bisect import bisect_left
+
+import numpy as np
+
+import get_stock_info
+from benchmark_cache import to_timestamp
+from candle_store import save_candle_store
+from common_data_type import candles_info
+from conftest import make_candles
+
+
+def candles_since(candles: dict, since: str) -> candles_info:
+    first = bisect_left(candles["timestamps"], to_timestamp(since))
+    return candles_info(**{column: values[first:] for column, values in candles.items()})
+
+
+def test_sync_refetches_tickers_missing_in_a_batch(monkeypatch):
+    latest = make_candles(tickers=4)
+    stored = {name: {column: values[:-20] for column, values in candles.items()} for name, candles in latest.items()}
+    calls = []
+
+    def download(ticket_names, threads, start):
+        calls.append(list(ticket_names))
+        # T01 is left out of every batch answer , T02 is never answered
+        if len(ticket_names) > 1:
+            return {name: candles_since(latest[name], start) for name in ticket_names if name not in ("T01", "T02")}
+        return {name: candles_since(latest[name], start) for name in ticket_names if name != "T02"}
+
+    monkeypatch.setattr(get_stock_info, "load_prices_from_yahoo_batch", download)
+    monkeypatch.setattr(get_stock_info, "SOCKET_DELAY", 0)
+
+    synced = get_stock_info.sync_history(stored_candles=stored, names=list(stored), batch_size=10)
+
+    assert ["T01"] in calls
+    assert synced["T00"]["timestamps"] == latest["T00"]["timestamps"]
+    assert synced["T01"]["timestamps"] == latest["T01"]["timestamps"]
+    assert synced["T02"] == stored["T02"]
+
+
+def test_incremental_sync_reads_and_writes_the_store(monkeypatch, tmp_path):
+    latest = make_candles(tickers=3)
+    store_path = str(tmp_path / "candles_store")
+    save_candle_store({name: {column: values[:-20] for column, values in candles.items()} for name, candles in latest.items()}, store_path)
+
+    monkeypatch.setattr(get_stock_info, "PRICE_STORE", store_path)
+    monkeypatch.setattr(get_stock_info, "SOCKET_DELAY", 0)
+    monkeypatch.setattr(get_stock_info, "load_prices_from_yahoo_batch",
+                        lambda ticket_names, threads, start: {name: candles_since(latest[name], start) for name in ticket_names})
+
+    tickets_info = {name: {} for name in latest}
+    get_stock_info.get_stock_history_price_data(tickets_info, incremental=True)
+    reused = get_stock_info.get_stock_history_price_data(tickets_info, reuse_data=True)
+
+    assert list(reused) == list(latest)
+    for name, candles in latest.items():
+        for column, values in candles.items():
+            assert np.array_equal(reused[name][column], values)
+
+
+def test_info_cache_only_fetches_new_and_expired_symbols(monkeypatch, tmp_path):
+    latest = make_candles(tickers=200, seed=2)
+    store_path = str(tmp_path / "candles_store")
+    save_candle_store(latest, store_path)
+    names = list(latest)
+    fetched = []
+
+    def fetch_ticker_info(name):
+        fetched.append(name)
+        return get_stock_info.Ticket(ticket=name, sector="Tech", industry="Chips", marketCap=1, shares=1000)
+
+    clock = [1.7e9]
+    monkeypatch.setattr(get_stock_info, "PRICE_STORE", store_path)
+    monkeypatch.setattr(get_stock_info, "STOCK_INFO_CACHE_PATH", str(tmp_path / "stock_info_cache.json"))
+    monkeypatch.setattr(get_stock_info, "fetch_ticker_info", fetch_ticker_info)
+    monkeypatch.setattr(get_stock_info.time, "time", lambda: clock[0])
+
+    get_stock_info.refresh_stock_info_cache(names=names, rate=1000)
+    assert len(fetched) == len(names)
+
+    # a month of nightly runs , the market cap follows the close without a request
+    fetched.clear()
+    for _ in range(30):
+        clock[0] += 86400
+        infos = get_stock_info.refresh_stock_info_cache(names=names + ["NEW"], rate=1000)
+    assert fetched == ["NEW"]
+    assert infos["T05"].marketCap == 1000 * latest["T05"]["closes"][-1]
+
+    # the whole universe comes back spread over 90 to 180 days
+    fetched.clear()
+    clock[0] += 120 * 86400
+    get_stock_info.refresh_stock_info_cache(names=names, rate=1000)
+    assert 0 < len(fetched) < len(names)
@@ -0,0 +1,49 @@
+import filecmp
+import os
+from datetime import datetime
+
+from conftest import make_candles, make_model
+from data_analysis import trading_days, slice_data, history_price_filter
+from price_panel import PricePanel
+
+
+def test_histories_match_cal_data_on_missing_bars():
+    model = make_model(make_candles(tickers=30, missing=0.1, seed=3), datetime(2012, 1, 2, 8), datetime(2012, 12, 31, 8))
+    panel = PricePanel(all_data=model.stocks_price_data, tickets_info=model.stocks_info, since=model.start_date)
+
+    compared = 0
+    for day in trading_days(model.start_date, model.end_date):
+        expected = {}
+        for name, candles in model.stocks_price_data.items():
+            sliced = slice_data(start_date=day, ticket_candles=candles)
+            history = history_price_filter(candles=sliced) if sliced is not None else None
+            if history is not None:
+                expected[name] = history
+
+        histories = panel.histories(day)
+        assert list(histories) == list(expected)
+        assert histories == expected
+        compared += len(expected)
+
+    assert compared > 1000
+
+
+def test_panel_run_writes_the_reports_of_cal_data(workdir):
+    candles = make_candles(tickers=16, missing=0.1)
+
+    outputs = []
+    for panel in [False, True]:
+        folder = workdir / ("panel" if panel else "cal_data")
+        for report in ["report", "rs_report", "classic"]:
+            (folder / report).mkdir(parents=True)
+        os.chdir(folder)
+
+        model = make_model(candles, datetime(2012, 3, 1, 8), datetime(2012, 3, 30, 8))
+        model.run(panel=panel)
+        outputs.append(folder)
+
+    assert filecmp.cmp(outputs[0] / "datasheet.csv", outputs[1] / "datasheet.csv", shallow=False)
+    for report in ["report", "rs_report", "classic"]:
+        names = sorted(os.listdir(outputs[0] / report))
+        assert names and names == sorted(os.listdir(outputs[1] / report))
+        assert filecmp.cmpfiles(outputs[0] / report, outputs[1] / report, names, shallow=False)[0] == names
@@ -0,0 +1,28 @@
+from datetime import datetime
+
+import pandas as pd
+
+import sweep
+from conftest import make_candles, make_model
+
+
+def test_default_config_picks_the_rules_of_the_rs_report(workdir):
+    candles = make_candles(tickers=40, missing=0.05)
+    # spy trades every market day
+    candles["T00"] = make_candles(tickers=1)["T00"]
+    model = make_model(candles, datetime(2012, 3, 1, 8), datetime(2012, 4, 30, 8))
+    model.run(rolling=True)
+    sweep.ParameterSweep(model=model, configs=[sweep.SweepConfig()]).run()
+
+    days = pd.read_csv(workdir / sweep.SWEEP_DIR / "config_0.csv")
+    assert len(days) and days["powerful"].sum()
+
+    for _, day in days.iterrows():
+        report = pd.read_csv(workdir / "rs_report" / f"rs_model_{day.start_date}.csv")
+        qualified = report[report["close_to_high_10%"] & report["powerful_than_spy"] & report["group_powerful_than_spy"] &
+                           report["breakout_with_big_volume"] & (report["rank"] >= 90)]
+        powerful = report[report["powerful_than_spy"] & report["group_powerful_than_spy"] & report["above_all_moving_avg_line"]]
+
+        names = lambda value: set() if pd.isna(value) else set(value.split(" ,"))
+        assert names(day.qualified_names) == set(qualified["name"])
+        assert names(day.powerful_names) == set(powerful["name"])
@@ -1,9 +1,10 @@
-import pandas as pd
 import numpy as np
 import time
 import datetime
 from stock_rules import rs_above_90 , heat_rank_rs90 , qualified_stocks
-from file_io import read_stock_info_json , read_stock_price_json
+from file_io import read_stock_info_json
+from database import Feature_database , FEATURE_DATABASE_PATH
+from feature_store import TURNOVER_BARS , EMA_SPAN , ATR_BARS
 from update_news import chat
 
 HEADER = "###{},"
@@ -29,57 +30,38 @@ def today_stock():
 
 
 
-def check_stock_conditions(stock_name , timestamps, opens, highs, lows, closes, volumes, verbose=True):
+def check_stock_conditions(stock_name , features : dict, verbose=True):
+    """
+    features : row of the feature store (Feature_database) , the last day of stock_name
+    """
     messages = []
 
-    if not (len(timestamps) == len(opens) == len(highs) == len(lows) == len(closes) == len(volumes)):
-        messages.append("❌ 資料長度不一致")
-        return False, messages
-
-    df = pd.DataFrame({
-        'timestamp': timestamps,
-        'Open': opens,
-        'High': highs,
-        'Low': lows,
-        'Close': closes,
-        'Volume': volumes
-    })
-
-    if len(df) < 15:
-        messages.append(f"❌ 資料過少：僅 {len(df)} 天，需至少 15 天")
+    if features["bars"] < 15:
+        messages.append(f"❌ 資料過少：僅 {features['bars']} 天，需至少 15 天")
         return False, messages
 
     # 成交額
-    period_turnover = min(30, len(df))
-    df['Value'] = df['Close'] * df['Volume']
-    df['AvgTurnover'] = df['Value'].rolling(window=period_turnover).mean()
-    turnover_value = df['AvgTurnover'].iloc[-1]
+    period_turnover = min(TURNOVER_BARS, features["bars"])
+    turnover_value = features["avg_turnover_30"] or 0
     turnover_ok = turnover_value > 50000000
 
     # EMA乖離
-    ema_span = min(10, len(df))
-    df['EMA'] = df['Close'].ewm(span=ema_span, adjust=False).mean()
-    ema = df['EMA'].iloc[-1]
-    close = df['Close'].iloc[-1]
+    ema_span = EMA_SPAN
+    ema = features["ema_10"]
+    close = features["close"]
     bias = (close - ema) / ema * 100
     bias_ok = True #bias < 20.0
 
     # ATR
-    tr1 = df['High'] - df['Low']
-    tr2 = (df['High'] - df['Close'].shift(1)).abs()
-    tr3 = (df['Low'] - df['Close'].shift(1)).abs()
-    tr = pd.concat([tr1, tr2, tr3], axis=1).max(axis=1)
-    period_atr = min(14, len(df))
-    df['ATR'] = tr.rolling(window=period_atr).mean()
-    atr = df['ATR'].iloc[-1]
-    atr_range = df['High'].iloc[-1] - df['Low'].iloc[-1]
+    period_atr = ATR_BARS
+    atr = features["atr_14"]
+    atr_range = features["high"] - features["low"]
     atr_ok = True #atr_range < 2.0 * atr
 
     # 52週高點差距
-    high_lookback = min(252, len(df))
-    df['RollingHigh'] = df['Close'].rolling(window=high_lookback).max()
-    rolling_high = df['RollingHigh'].iloc[-1]
-    if pd.isna(rolling_high) or rolling_high == 0:
+    high_lookback = min(252, features["bars"])
+    rolling_high = features["weekly_52_high"]
+    if rolling_high is None or rolling_high == 0:
         high_gap_ok = False
         gap = float('inf')
     else:
@@ -101,29 +83,25 @@ def check_stock_conditions(stock_name , timestamps, opens, highs, lows, closes,
 def main():
 
     info = read_stock_info_json()
-    price = read_stock_price_json()
+
+    over90_stocks = rs_above_90()['name'].to_list()
+    breakout_toady_stocks = today_stock()
+
+    with Feature_database(db_name=FEATURE_DATABASE_PATH) as db:
+        features = db.query_latest(tickers=set(over90_stocks) | set(breakout_toady_stocks))
 
     with open("trading_view_list_over90.txt",mode='w',) as file:
         over90_group = {}
         txt_words = ""
-        over90_stocks = rs_above_90()['name'].to_list()
 
         for stock in over90_stocks:
 
-            timestamps = price[stock]["timestamps"]
-            opens = price[stock]["opens"]
-            highs = price[stock]["highs"]
-            lows = price[stock]["lows"]
-            closes = price[stock]["closes"]
-            volumes = price[stock]["volumes"]
+            if stock not in features:
+                print(f"{stock} not in the feature store")
+                continue
 
             is_pass , message = check_stock_conditions(stock_name=stock,
-                                        timestamps=timestamps,
-                                        opens=opens,
-                                        highs=highs,
-                                        lows=lows,
-                                        closes=closes,
-                                        volumes=volumes,)
+                                        features=features[stock],)
 
             if not is_pass:
                 print(message)
@@ -149,24 +127,15 @@ def main():
     with open("today_stock.txt",mode='w',) as file:
         txt_words = ""
         breakout_group = {}
-        breakout_toady_stocks = today_stock()
 
         for stock in breakout_toady_stocks:
 
-            timestamps = price[stock]["timestamps"]
-            opens = price[stock]["opens"]
-            highs = price[stock]["highs"]
-            lows = price[stock]["lows"]
-            closes = price[stock]["closes"]
-            volumes = price[stock]["volumes"]
+            if stock not in features:
+                print(f"{stock} not in the feature store")
+                continue
 
             is_pass , message = check_stock_conditions(stock_name=stock,
-                                        timestamps=timestamps,
-                                        opens=opens,
-                                        highs=highs,
-                                        lows=lows,
-                                        closes=closes,
-                                        volumes=volumes,)
+                                        features=features[stock],)
 
             if not is_pass:
                 print(message)
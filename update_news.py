@@ -1,4 +1,4 @@
-import requests
+from session_pool import http_post
 import json
 import random
 import time
@@ -55,7 +55,7 @@ def chat(contents:list , chanel_list : list = ["1302051093596868658"]):
 
                 url = "https://discord.com/api/v9/channels/{}/messages".format(chanel_id)
                 try:
-                    res = requests.post(url=url, headers=header, data=json.dumps(msg))
+                    res = http_post(url=url, headers=header, data=json.dumps(msg))
                     print(res.content)
                 except Exception as e:
                     print(e)
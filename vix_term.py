@@ -1,6 +1,7 @@
 import sqlite3
 from pathlib import Path
-import yfinance as yf
+from market_data import get_provider
+from fetch_policy import FetchPolicy, fetch_with_retry_queue
 from datetime import datetime
 from pandas_market_calendars import get_calendar
 import sys
@@ -13,6 +14,8 @@ from vix_term_summary import plot_vix_term_summary
 
 VIX_DB = Path(__file__).parent / "database" / "vix_data.db"
 
+VIX_POLICY = FetchPolicy(retries=3, base_delay=2, max_delay=30)
+
 def is_holiday(date: datetime) -> bool:
     nyse = get_calendar('NYSE')
     valid_days = nyse.valid_days(start_date=date, end_date=date)
@@ -26,15 +29,17 @@ def fetch_vix_term_structure():
         "vix6m": "^VIX6M",
         "vix1y": "^VIX1Y"
     }
+    def fetch_close(symbol):
+        data = get_provider().history(symbol, period="1d", interval="1d")
+        return data.iloc[-1]['Close']
+
+    prices = fetch_with_retry_queue(fetch=fetch_close, items=list(symbols.values()), policy=VIX_POLICY)
+
     result = {}
     for name, symbol in symbols.items():
-        try:
-            data = yf.Ticker(symbol).history(period="1d", interval="1d")
-            price = data.iloc[-1]['Close']
-            result[name] = price
-        except Exception as e:
-            print(f"Error fetching {name}: {e}")
-            result[name] = None
+        if symbol not in prices:
+            print(f"Error fetching {name}")
+        result[name] = prices.get(symbol)
     return result
 
 def main(date : str):
@@ -60,7 +65,7 @@ def main(date : str):
         print(f"{name}: {price:.2f}" if price else f"{name}: N/A")
 
     # === 填入今天要存的資料
-    vix_data = fetch_vix_term_structure()
+    vix_data = dict(term_structure)
     vix_data["date"] = date
 
     # === 自動計算 Spread